@@ -0,0 +1,243 @@
+"""
+Consultas de rutas en lote, sin interfaz gráfica.
+
+Lee consultas desde un archivo JSONL (un objeto por línea con 'origin',
+'destination' y opcionalmente 'has_visa' y 'mode') o CSV (filas
+origen,destino[,visa[,modo]] sin encabezado) y escribe un resultado JSONL por
+consulta, en el mismo orden de entrada. Las consultas se agrupan por origen,
+visa y modo para que cada grupo se resuelva con una sola búsqueda desde el
+origen, y los grupos se reparten entre varios procesos. Una línea mal formada
+produce un resultado con 'error' en su posición en lugar de detener el lote.
+
+Uso:
+    python batch_query.py consultas.jsonl -o resultados.jsonl --workers 4
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from travel_graph import TravelGraph
+
+_TRUE_VALUES = ("1", "true", "si", "sí", "yes", "tengo visa")
+
+_worker_graph = None
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in _TRUE_VALUES
+
+
+def _make_query(origin, destination, has_visa=False, mode="costo"):
+    return {
+        'origin': str(origin).strip(),
+        'destination': str(destination).strip(),
+        'has_visa': _parse_bool(has_visa),
+        'mode': str(mode).strip() or "costo",
+    }
+
+
+def _invalid_query(line_number, message):
+    return {'error': f"Consulta inválida en la línea {line_number}: {message}", 'line': line_number}
+
+
+def read_queries(stream, query_format="jsonl"):
+    """
+    Produce las consultas del flujo de entrada, una por línea o fila.
+    Una línea mal formada no detiene la lectura: produce una consulta con la
+    clave 'error' que se escribe como resultado en su misma posición.
+    """
+    if query_format == "csv":
+        reader = csv.reader(stream)
+        for row in reader:
+            if not any(field.strip() for field in row):
+                continue
+            if len(row) < 2:
+                yield _invalid_query(reader.line_num, "se esperaba origen,destino[,visa[,modo]]")
+            else:
+                yield _make_query(*row[:4])
+        return
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+            yield _make_query(data['origin'], data['destination'],
+                              data.get('has_visa', False), data.get('mode', "costo"))
+        except json.JSONDecodeError as e:
+            yield _invalid_query(line_number, f"JSON mal formado ({e.msg})")
+        except KeyError as e:
+            yield _invalid_query(line_number, f"falta el campo {e}")
+        except (TypeError, AttributeError):
+            yield _invalid_query(line_number, "se esperaba un objeto JSON")
+
+
+def group_queries(queries):
+    """
+    Agrupa consultas numeradas por (origen, visa, modo).
+    Recibe pares (secuencia, consulta) y retorna {clave: [(secuencia, destino), ...]}.
+    Las consultas inválidas (con 'error') no se agrupan.
+    """
+    groups = {}
+    for seq, query in queries:
+        if 'error' in query:
+            continue
+        key = (query['origin'], query['has_visa'], query['mode'])
+        groups.setdefault(key, []).append((seq, query['destination']))
+    return groups
+
+
+def solve_group(graph, key, targets):
+    """Resuelve un grupo con una búsqueda desde su origen. Retorna [(secuencia, resultado), ...]."""
+    origin, has_visa, mode = key
+    if mode in ("costo", "escalas"):
+        tree = graph.find_routes_from(origin, has_visa, mode)
+        error = "Origen o destino no accesible sin visa o no existe."
+    else:
+        tree, error = None, f"Modo de búsqueda desconocido: {mode}"
+
+    results = []
+    for seq, destination in targets:
+        if tree is None:
+            cost, stops, path = None, None, error
+        else:
+            cost, stops, path = tree.route(destination)
+        result = {'origin': origin, 'destination': destination, 'has_visa': has_visa, 'mode': mode}
+        if cost is None:
+            result['error'] = path
+        else:
+            result.update(cost=cost, stops=stops, path=path)
+        results.append((seq, result))
+    return results
+
+
+def load_graph(destinations_path, fares_path, backend="networkx"):
+    """
+    Construye el grafo para resolver consultas.
+    Lanza ValueError si no se pudieron leer los destinos o las tarifas, para
+    no responder cada consulta con un error de aeropuerto inexistente.
+    """
+    graph = TravelGraph.from_files(destinations_path, fares_path, backend=backend, cache_size=0)
+    if graph.destinations is None or graph.fares is None:
+        raise ValueError(f"No se pudieron cargar los datos de '{destinations_path}' y '{fares_path}'.")
+    return graph
+
+
+def _init_worker(destinations_path, fares_path, backend):
+    global _worker_graph
+    _worker_graph = load_graph(destinations_path, fares_path, backend)
+
+
+def _solve_in_worker(key, targets):
+    return solve_group(_worker_graph, key, targets)
+
+
+def _invalid_results(chunk):
+    """Resultados de las consultas inválidas del bloque, por secuencia."""
+    return {seq: query for seq, query in chunk if 'error' in query}
+
+
+def _chunks(queries, chunk_size):
+    chunk = []
+    for item in enumerate(queries):
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(queries, destinations_path="destinos.txt", fares_path="tarifas.txt",
+              workers=None, backend="networkx", chunk_size=10000):
+    """
+    Resuelve las consultas y produce sus resultados en el orden de entrada.
+    Las consultas se leen en bloques de chunk_size; dentro de cada bloque se
+    agrupan por origen y los grupos se reparten entre 'workers' procesos
+    (1 resuelve todo en el proceso actual).
+    Los datos se cargan antes de retornar, de modo que un archivo faltante
+    lanza ValueError de inmediato y no al pedir el primer resultado.
+    """
+    workers = workers or os.cpu_count() or 1
+    # También deja listo el caché binario de tarifas para los procesos.
+    graph = load_graph(destinations_path, fares_path, backend)
+    if workers == 1:
+        return _run_serial(graph, queries, chunk_size)
+    return _run_parallel(queries, destinations_path, fares_path, workers, backend, chunk_size)
+
+
+def _run_serial(graph, queries, chunk_size):
+    for chunk in _chunks(queries, chunk_size):
+        solved = _invalid_results(chunk)
+        for key, targets in group_queries(chunk).items():
+            solved.update(solve_group(graph, key, targets))
+        for seq, _ in chunk:
+            yield solved[seq]
+
+
+def _run_parallel(queries, destinations_path, fares_path, workers, backend, chunk_size):
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(destinations_path, fares_path, backend)) as executor:
+        for chunk in _chunks(queries, chunk_size):
+            futures = [executor.submit(_solve_in_worker, key, targets)
+                       for key, targets in group_queries(chunk).items()]
+            solved = _invalid_results(chunk)
+            next_index = 0
+            # Se emite cada resultado apenas están listos todos los anteriores.
+            for future in futures:
+                solved.update(future.result())
+                while next_index < len(chunk) and chunk[next_index][0] in solved:
+                    yield solved.pop(chunk[next_index][0])
+                    next_index += 1
+            while next_index < len(chunk):
+                yield solved.pop(chunk[next_index][0])
+                next_index += 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calcula rutas de Metro Travel en lote.")
+    parser.add_argument("queries", help="Archivo de consultas (.jsonl o .csv); '-' para la entrada estándar.")
+    parser.add_argument("-o", "--output", default="-", help="Archivo JSONL de resultados ('-' para la salida estándar).")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="Formato de las consultas (por defecto según la extensión).")
+    parser.add_argument("--destinos", default="destinos.txt", help="Archivo de destinos.")
+    parser.add_argument("--tarifas", default="tarifas.txt", help="Archivo de tarifas.")
+    parser.add_argument("--workers", type=int, default=None, help="Cantidad de procesos (por defecto, uno por núcleo).")
+    parser.add_argument("--backend", choices=("networkx", "csr"), default="networkx")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Consultas agrupadas por bloque.")
+    args = parser.parse_args(argv)
+
+    query_format = args.format or ("csv" if args.queries.lower().endswith(".csv") else "jsonl")
+    try:
+        source = sys.stdin if args.queries == "-" else open(args.queries, mode='r', newline='', encoding='utf-8')
+    except OSError as e:
+        parser.exit(1, f"Error: No se pudo abrir el archivo de consultas '{args.queries}': {e.strerror}\n")
+    try:
+        results = run_batch(read_queries(source, query_format), args.destinos, args.tarifas,
+                            workers=args.workers, backend=args.backend, chunk_size=args.chunk_size)
+    except ValueError as e:
+        if source is not sys.stdin:
+            source.close()
+        parser.exit(1, f"Error: {e}\n")
+    try:
+        target = sys.stdout if args.output == "-" else open(args.output, mode='w', encoding='utf-8')
+    except OSError as e:
+        if source is not sys.stdin:
+            source.close()
+        parser.exit(1, f"Error: No se pudo abrir el archivo de resultados '{args.output}': {e.strerror}\n")
+    try:
+        for result in results:
+            target.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+
+if __name__ == "__main__":
+    main()
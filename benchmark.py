@@ -0,0 +1,338 @@
+"""
+Benchmarks de TravelGraph sobre redes sintéticas.
+
+Genera redes reproducibles (misma semilla, mismos archivos) con el formato de
+destinos.txt y tarifas.txt: islas agrupadas en archipiélagos, unos pocos
+aeropuertos centrales con vuelos entre archipiélagos y una fracción
+configurable de destinos que requieren visa. Sobre cada red mide la lectura
+de archivos, la construcción del grafo con ambos backends, cada método de
+consulta, las k rutas más baratas y el dibujo, y escribe los tiempos en JSON
+para comparar corridas.
+
+Uso:
+    python benchmark.py --sizes 100,1000,10000,100000 -o resultados.json
+    python benchmark.py --baseline resultados.json -o nuevos.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from data_loader import load_fare_columns, read_destinations, read_fares
+from travel_graph import TravelGraph
+
+_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def airport_code(index, width=3):
+    """Código de letras (AAA, AAB, ...) del aeropuerto número index."""
+    letters = []
+    for _ in range(width):
+        index, digit = divmod(index, len(_LETTERS))
+        letters.append(_LETTERS[digit])
+    return "".join(reversed(letters))
+
+
+def generate_network(num_airports, average_degree=4.0, visa_fraction=0.3, seed=0):
+    """
+    Genera una red sintética de num_airports aeropuertos.
+    Los aeropuertos se reparten en archipiélagos; los vuelos locales unen
+    islas cercanas y cada isla tiene además un vuelo a algún aeropuerto
+    central, de modo que la red es conexa. El precio crece con la distancia.
+    El primer aeropuerto es central y nunca requiere visa.
+    Retorna (destinos, tarifas) como listas de tuplas de texto.
+    """
+    rng = np.random.default_rng(seed)
+    width = 3
+    while len(_LETTERS) ** width < num_airports:
+        width += 1
+    codes = [airport_code(i, width) for i in range(num_airports)]
+
+    hub_count = max(1, num_airports // 50)
+    archipelago_count = max(1, num_airports // 25)
+    centers = rng.uniform(0, 3000, size=(archipelago_count, 2))
+    # Islas consecutivas pertenecen al mismo archipiélago.
+    archipelago = np.sort(rng.integers(0, archipelago_count, size=num_airports))
+    positions = centers[archipelago] + rng.normal(0, 60, size=(num_airports, 2))
+
+    requires_visa = rng.random(num_airports) < visa_fraction
+    hubs = np.sort(rng.choice(num_airports, size=hub_count, replace=False))
+    hubs[0] = 0
+    requires_visa[hubs] = False
+
+    nodes = np.arange(num_airports)
+    # Cada isla vuela a un aeropuerto central y los centrales forman una cadena.
+    origins = [nodes, hubs[:-1]]
+    destinations = [rng.choice(hubs, size=num_airports), hubs[1:]]
+    extra = max(0, int(num_airports * average_degree / 2) - num_airports - (hub_count - 1))
+    if extra and num_airports > 1:
+        local = rng.integers(0, num_airports, size=extra)
+        offsets = rng.integers(1, 25, size=extra) * rng.choice((-1, 1), size=extra)
+        origins.append(local)
+        destinations.append(np.clip(local + offsets, 0, num_airports - 1))
+    origins = np.concatenate(origins)
+    destinations = np.concatenate(destinations)
+
+    keep = origins != destinations
+    pairs = np.unique(np.sort(np.stack([origins[keep], destinations[keep]], axis=1), axis=1), axis=0)
+    distance = np.linalg.norm(positions[pairs[:, 0]] - positions[pairs[:, 1]], axis=1)
+    prices = np.round(25 + 0.15 * distance + rng.uniform(0, 40, size=len(pairs)), 2)
+
+    destinations_rows = [
+        (code, f"Isla {code}", "Requiere Visa" if visa else "No Requiere Visa")
+        for code, visa in zip(codes, requires_visa.tolist())
+    ]
+    fares_rows = [(codes[u], codes[v], f"{price:.2f}") for (u, v), price in zip(pairs.tolist(), prices.tolist())]
+    return destinations_rows, fares_rows
+
+
+def write_network(directory, destinations_rows, fares_rows):
+    """Escribe la red en destinos.txt y tarifas.txt dentro de directory. Retorna ambas rutas."""
+    destinations_path = os.path.join(directory, "destinos.txt")
+    fares_path = os.path.join(directory, "tarifas.txt")
+    with open(destinations_path, mode='w', encoding='utf-8') as file:
+        file.writelines(",".join(row) + "\n" for row in destinations_rows)
+    with open(fares_path, mode='w', encoding='utf-8') as file:
+        file.writelines(",".join(row) + "\n" for row in fares_rows)
+    return destinations_path, fares_path
+
+
+def _summary(samples):
+    return {
+        'samples': len(samples),
+        'min_s': min(samples),
+        'median_s': statistics.median(samples),
+        'mean_s': statistics.fmean(samples),
+        'max_s': max(samples),
+    }
+
+
+def time_calls(function, calls, warmup=1):
+    """
+    Ejecuta function(*args) para cada tupla de calls y retorna el tiempo de
+    cada llamada. Las primeras 'warmup' llamadas se ejecutan antes, sin
+    medirse, para no contar trabajo que se hace una sola vez.
+    """
+    for args in calls[:warmup]:
+        function(*args)
+    samples = []
+    for args in calls:
+        start = time.perf_counter()
+        function(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def time_once(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+class BenchmarkRun:
+    """Acumula los resultados de una corrida como filas con tamaño, backend y nombre."""
+
+    def __init__(self, verbose=True):
+        self.results = []
+        self.verbose = verbose
+
+    def record(self, size, backend, name, samples):
+        row = {'size': size, 'backend': backend, 'benchmark': name}
+        row.update(_summary(samples))
+        self.results.append(row)
+        if self.verbose:
+            print(f"{size:>7} {backend or '-':<9} {name:<46} mediana {row['median_s'] * 1000:10.3f} ms"
+                  f"  ({row['samples']} muestras)", file=sys.stderr)
+
+
+def _query_pairs(codes, count, seed):
+    rng = random.Random(seed)
+    return [tuple(rng.sample(codes, 2)) for _ in range(count)]
+
+
+def benchmark_loading(run, size, destinations_path, fares_path, repeat):
+    run.record(size, None, "read_destinations", time_calls(read_destinations, [(destinations_path,)] * repeat, 0))
+    run.record(size, None, "read_fares", time_calls(read_fares, [(fares_path,)] * repeat, 0))
+    run.record(size, None, "load_fare_columns (sin caché)",
+               time_calls(load_fare_columns, [(fares_path, False)] * repeat, 0))
+    # La primera llamada con caché lo escribe; las medidas lo reutilizan.
+    run.record(size, None, "load_fare_columns (caché)",
+               time_calls(load_fare_columns, [(fares_path, True)] * repeat, 1))
+
+
+def benchmark_construction(run, size, destinations_path, fares_path, repeat, precompute):
+    destinations = read_destinations(destinations_path)
+    fares = read_fares(fares_path)
+    columns = load_fare_columns(fares_path)
+    run.record(size, "networkx", "construcción",
+               time_calls(lambda: TravelGraph(destinations, fares, cache_size=0), [()] * repeat, 0))
+    run.record(size, "csr", "construcción",
+               time_calls(lambda: TravelGraph(destinations, columns, backend="csr", cache_size=0), [()] * repeat, 0))
+    for backend in ("networkx", "csr"):
+        run.record(size, backend, "from_files",
+                   time_calls(lambda: TravelGraph.from_files(destinations_path, fares_path, backend=backend,
+                                                             cache_size=0), [()] * repeat, 0))
+        if precompute:
+            run.record(size, backend, "construcción con tablas",
+                       time_calls(lambda: TravelGraph(destinations, columns, precompute=True, backend=backend,
+                                                      cache_size=0).warm_up(),
+                                  [()], 0))
+
+
+def benchmark_queries(run, size, destinations_path, fares_path, queries, k, seed):
+    destinations = read_destinations(destinations_path)
+    columns = load_fare_columns(fares_path)
+    visa_free = [code for code, data in destinations.items() if not data['requiere_visa']]
+    all_codes = list(destinations)
+    few = max(2, queries // 4)
+
+    for backend in ("networkx", "csr"):
+        graph = TravelGraph(destinations, columns, backend=backend, cache_size=0)
+        for has_visa, codes in ((True, all_codes), (False, visa_free)):
+            suffix = "con visa" if has_visa else "sin visa"
+            pairs = _query_pairs(codes, queries + 1, seed)
+            for algorithm in ("dijkstra", "bidirectional", "alt"):
+                for mode in ("costo", "escalas"):
+                    samples = time_calls(
+                        lambda o, d: graph.find_route(o, d, has_visa, mode, algorithm=algorithm), pairs)
+                    run.record(size, backend, f"find_route {mode} {algorithm} {suffix}", samples)
+
+            subset = pairs[:few + 1]
+            run.record(size, backend, f"find_cheapest_route_max_stops {suffix}",
+                       time_calls(lambda o, d: graph.find_cheapest_route_max_stops(o, d, has_visa, 3), subset))
+            run.record(size, backend, f"find_pareto_routes {suffix}",
+                       time_calls(lambda o, d: graph.find_pareto_routes(o, d, has_visa, max_stops=4), subset))
+            run.record(size, backend, f"find_k_shortest_paths_cost k={k} {suffix}",
+                       time_calls(lambda o, d: graph.find_k_shortest_paths_cost(o, d, has_visa, k), subset))
+            run.record(size, backend, f"find_routes_from {suffix}",
+                       time_calls(lambda o, _: graph.find_routes_from(o, has_visa), subset))
+            origins = [origin for origin, _ in subset]
+            run.record(size, backend, f"fare_matrix {len(origins)}x{len(codes)} {suffix}",
+                       time_calls(lambda: graph.fare_matrix(origins, has_visa=has_visa), [()], 0))
+
+
+def benchmark_drawing(run, size, destinations_path, fares_path, seed):
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+
+    graph = TravelGraph.from_files(destinations_path, fares_path, cache_size=0)
+    origin, destination = _query_pairs(list(graph.destinations), 1, seed)[0]
+    _, _, path = graph.find_route(origin, destination, True)
+    path = path if isinstance(path, list) else None
+
+    _, elapsed = time_once(graph.get_layout, True)
+    run.record(size, "networkx", "get_layout", [elapsed])
+    figure, elapsed = time_once(graph.draw_graph_with_path, origin, destination, path, True)
+    run.record(size, "networkx", "draw_graph_with_path", [elapsed])
+    plt.close(figure)
+
+
+def run_benchmarks(sizes, average_degree=4.0, visa_fraction=0.3, seed=0, queries=20, k=4, repeat=3,
+                   draw_limit=1000, precompute_limit=500, data_dir=None, verbose=True):
+    """
+    Ejecuta todos los benchmarks para cada tamaño de red.
+    Las redes se escriben en data_dir (por defecto, un directorio temporal).
+    Retorna el diccionario de resultados que se guarda en JSON.
+    """
+    run = BenchmarkRun(verbose)
+    config = {'sizes': list(sizes), 'average_degree': average_degree, 'visa_fraction': visa_fraction,
+              'seed': seed, 'queries': queries, 'k': k, 'repeat': repeat,
+              'draw_limit': draw_limit, 'precompute_limit': precompute_limit}
+
+    with tempfile.TemporaryDirectory(prefix="metro_travel_bench_") as scratch:
+        for size in sizes:
+            directory = os.path.join(data_dir or scratch, f"red_{size}")
+            os.makedirs(directory, exist_ok=True)
+            rows, elapsed = time_once(generate_network, size, average_degree, visa_fraction, seed)
+            paths = write_network(directory, *rows)
+            run.record(size, None, "generación", [elapsed])
+            if verbose:
+                print(f"Red de {size} aeropuertos y {len(rows[1])} vuelos en {directory}", file=sys.stderr)
+
+            benchmark_loading(run, size, *paths, repeat)
+            benchmark_construction(run, size, *paths, repeat, precompute=size <= precompute_limit)
+            benchmark_queries(run, size, *paths, queries, k, seed)
+            if size <= draw_limit:
+                benchmark_drawing(run, size, *paths, seed)
+
+    import networkx as nx
+    return {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'networkx': nx.__version__,
+            'numpy': np.__version__,
+        },
+        'config': config,
+        'results': run.results,
+    }
+
+
+def compare_results(baseline, current, threshold=1.25):
+    """
+    Compara las medianas de dos corridas. Retorna las filas cuya mediana
+    actual es más de threshold veces la de la corrida base, como tuplas
+    (tamaño, backend, benchmark, mediana base, mediana actual).
+    """
+    previous = {(row['size'], row['backend'], row['benchmark']): row['median_s'] for row in baseline['results']}
+    regressions = []
+    for row in current['results']:
+        before = previous.get((row['size'], row['backend'], row['benchmark']))
+        if before and row['median_s'] > before * threshold:
+            regressions.append((row['size'], row['backend'], row['benchmark'], before, row['median_s']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de TravelGraph sobre redes sintéticas.")
+    parser.add_argument("--sizes", default="100,1000,10000,100000",
+                        help="Cantidades de aeropuertos separadas por comas.")
+    parser.add_argument("--degree", type=float, default=4.0, help="Grado promedio (vuelos por aeropuerto).")
+    parser.add_argument("--visa-fraction", type=float, default=0.3, help="Fracción de destinos que requieren visa.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=20, help="Consultas medidas por método.")
+    parser.add_argument("-k", type=int, default=4, help="Rutas pedidas a find_k_shortest_paths_cost.")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones de la carga y la construcción.")
+    parser.add_argument("--draw-limit", type=int, default=1000, help="Tamaño máximo de red que se dibuja.")
+    parser.add_argument("--precompute-limit", type=int, default=500,
+                        help="Tamaño máximo de red con tablas de todos los pares.")
+    parser.add_argument("--data-dir", help="Directorio donde conservar las redes generadas.")
+    parser.add_argument("-o", "--output", default="-", help="Archivo JSON de resultados ('-' para la salida estándar).")
+    parser.add_argument("--baseline", help="Resultados JSON de una corrida anterior para detectar regresiones.")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Proporción de la mediana base a partir de la cual se informa una regresión.")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    results = run_benchmarks(sizes, args.degree, args.visa_fraction, args.seed, args.queries, args.k,
+                             args.repeat, args.draw_limit, args.precompute_limit, args.data_dir)
+
+    payload = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output == "-":
+        print(payload)
+    else:
+        with open(args.output, mode='w', encoding='utf-8') as file:
+            file.write(payload + "\n")
+
+    if args.baseline:
+        with open(args.baseline, mode='r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare_results(baseline, results, args.threshold)
+        for size, backend, name, before, after in regressions:
+            print(f"Regresión: {size} {backend or '-'} {name}: {before * 1000:.3f} ms -> {after * 1000:.3f} ms",
+                  file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+import numpy as np
+
+from data_loader import FareColumns, remap_fare_columns
+
+
+class CSRGraph:
+    """
+    Grafo no dirigido de vuelos almacenado en arreglos NumPy.
+    Los códigos de aeropuerto se internan como enteros (su posición en 'codes')
+    y la adyacencia se guarda en formato CSR: los vecinos del nodo i son
+    indices[indptr[i]:indptr[i + 1]], con el costo correspondiente en weights.
+    La restricción de visa es una máscara booleana por nodo.
+
+    Las actualizaciones de precio se aplican en el lugar; los vuelos nuevos se
+    acumulan en listas pendientes y, al igual que quitar vuelos o aeropuertos,
+    solo marcan la adyacencia para reconstruirla en la siguiente consulta.
+    Un diccionario par de nodos -> posición localiza cada vuelo sin recorrer
+    los arreglos. Los aeropuertos eliminados conservan su identificador pero
+    quedan inactivos.
+    """
+
+    def __init__(self, codes, names, requires_visa, origins, destinations, costs):
+        self.codes = list(codes)
+        self.names = list(names)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.requires_visa = np.asarray(requires_visa, dtype=bool)
+        self.active = np.ones(len(self.codes), dtype=bool)
+        self.visa_free = ~self.requires_visa
+
+        origins = np.asarray(origins, dtype=np.int32)
+        destinations = np.asarray(destinations, dtype=np.int32)
+        costs = np.asarray(costs, dtype=np.float64)
+
+        # Igual que networkx.Graph: una sola arista por par, gana la última tarifa.
+        low = np.minimum(origins, destinations).astype(np.int64)
+        high = np.maximum(origins, destinations).astype(np.int64)
+        keys = low * len(self.codes) + high
+        _, last_from_end = np.unique(keys[::-1], return_index=True)
+        keep = np.sort(len(keys) - 1 - last_from_end)
+        self.edge_origins = origins[keep]
+        self.edge_destinations = destinations[keep]
+        self.edge_costs = costs[keep]
+        # Vuelos agregados desde la última consulta, aún fuera de los arreglos.
+        self._pending_origins = []
+        self._pending_destinations = []
+        self._pending_costs = []
+        # Posición de cada vuelo; se construye en la primera búsqueda por par.
+        self._slots = None
+        self._dirty = False
+        self._build_adjacency()
+
+    @classmethod
+    def from_data(cls, destinations_data, fares_data):
+        """
+        Crea el grafo a partir de los destinos de data_loader y de las tarifas,
+        ya sea como lista de diccionarios o como FareColumns.
+        """
+        destinations_data = destinations_data or {}
+        codes = list(destinations_data.keys())
+        names = [data['name'] for data in destinations_data.values()]
+        requires_visa = [data['requiere_visa'] for data in destinations_data.values()]
+        index = {code: i for i, code in enumerate(codes)}
+
+        if isinstance(fares_data, FareColumns):
+            origins, destinations, costs = remap_fare_columns(fares_data, index)
+            return cls(codes, names, requires_visa, origins, destinations, costs)
+
+        origins, destinations, costs = [], [], []
+        for fare in fares_data or []:
+            origin = fare['origin']
+            destination = fare['destination']
+            if origin in index and destination in index:
+                origins.append(index[origin])
+                destinations.append(index[destination])
+                costs.append(fare['price'])
+            else:
+                print(f"Advertencia: Vuelo de {origin} a {destination} no añadido, uno o ambos aeropuertos no existen en la lista de destinos.")
+        return cls(codes, names, requires_visa, origins, destinations, costs)
+
+    def _flush_pending(self):
+        """Pasa los vuelos pendientes a los arreglos de aristas en una sola copia."""
+        if not self._pending_costs:
+            return
+        self.edge_origins = np.concatenate([self.edge_origins, np.asarray(self._pending_origins, dtype=np.int32)])
+        self.edge_destinations = np.concatenate([self.edge_destinations, np.asarray(self._pending_destinations, dtype=np.int32)])
+        self.edge_costs = np.concatenate([self.edge_costs, np.asarray(self._pending_costs, dtype=np.float64)])
+        self._pending_origins = []
+        self._pending_destinations = []
+        self._pending_costs = []
+
+    def _build_adjacency(self):
+        """Construye indptr/indices/weights con ambas direcciones de cada arista."""
+        self._flush_pending()
+        n = len(self.codes)
+        loops = self.edge_origins == self.edge_destinations
+        sources = np.concatenate([self.edge_origins, self.edge_destinations[~loops]])
+        targets = np.concatenate([self.edge_destinations, self.edge_origins[~loops]])
+        weights = np.concatenate([self.edge_costs, self.edge_costs[~loops]])
+
+        order = np.argsort(sources, kind='stable')
+        self.indices = targets[order].astype(np.int32)
+        self.weights = weights[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=self.indptr[1:])
+        self._dirty = False
+
+    def _ensure_adjacency(self):
+        if self._dirty:
+            self._build_adjacency()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def is_accessible(self, code, has_visa: bool):
+        """Indica si el aeropuerto existe y puede visitarse con el estado de visa dado."""
+        node = self.index.get(code)
+        if node is None:
+            return False
+        return has_visa or bool(self.visa_free[node])
+
+    def active_codes(self):
+        """Códigos de los aeropuertos activos, en orden de identificador."""
+        return [self.codes[node] for node in np.flatnonzero(self.active).tolist()]
+
+    def accessible_nodes(self, has_visa: bool):
+        """Retorna los identificadores de los nodos visitables."""
+        if has_visa:
+            return np.flatnonzero(self.active).tolist()
+        return np.flatnonzero(self.visa_free).tolist()
+
+    def neighbors_function(self, has_visa: bool):
+        """
+        Retorna una función que enumera los pares (vecino, costo) de un nodo.
+        Sin visa, los vecinos que la requieren se descartan con la máscara.
+        """
+        self._ensure_adjacency()
+        indptr, indices, weights = self.indptr, self.indices, self.weights
+
+        if has_visa:
+            def neighbors(node):
+                start, end = indptr[node], indptr[node + 1]
+                return zip(indices[start:end].tolist(), weights[start:end].tolist())
+        else:
+            allowed = self.visa_free
+
+            def neighbors(node):
+                start, end = indptr[node], indptr[node + 1]
+                targets = indices[start:end]
+                keep = allowed[targets]
+                return zip(targets[keep].tolist(), weights[start:end][keep].tolist())
+
+        return neighbors
+
+    def edge_cost(self, origin, destination):
+        """Retorna el costo del vuelo entre dos nodos, o None si no existe."""
+        slot = self._edge_slot(origin, destination)
+        if slot is None:
+            return None
+        stored = len(self.edge_costs)
+        if slot < stored:
+            return float(self.edge_costs[slot])
+        return float(self._pending_costs[slot - stored])
+
+    def edge_arrays(self):
+        """Retorna (orígenes, destinos, costos) de todos los vuelos, incluidos los pendientes."""
+        self._flush_pending()
+        return self.edge_origins, self.edge_destinations, self.edge_costs
+
+    def to_networkx(self):
+        """Construye un networkx.Graph equivalente, por ejemplo para dibujarlo."""
+        import networkx as nx
+
+        self._flush_pending()
+        graph = nx.Graph()
+        for code, name, visa, active in zip(self.codes, self.names, self.requires_visa.tolist(), self.active.tolist()):
+            if active:
+                graph.add_node(code, name=name, requiere_visa=visa)
+        codes = self.codes
+        graph.add_edges_from(
+            (codes[u], codes[v], {'cost': cost, 'stops': 1})
+            for u, v, cost in zip(self.edge_origins.tolist(), self.edge_destinations.tolist(), self.edge_costs.tolist())
+        )
+        return graph
+
+    def _edge_slot(self, origin, destination):
+        """
+        Posición del vuelo entre dos nodos, o None. Las posiciones a partir de
+        len(edge_costs) corresponden a los vuelos pendientes.
+        """
+        if self._slots is None:
+            self._slots = {
+                (min(u, v), max(u, v)): slot
+                for slot, (u, v) in enumerate(zip(
+                    self.edge_origins.tolist() + self._pending_origins,
+                    self.edge_destinations.tolist() + self._pending_destinations,
+                ))
+            }
+        return self._slots.get((min(origin, destination), max(origin, destination)))
+
+    def set_edge(self, origin, destination, cost):
+        """
+        Agrega el vuelo entre dos nodos o actualiza su costo.
+        Retorna el costo anterior, o None si el vuelo no existía.
+        """
+        slot = self._edge_slot(origin, destination)
+        if slot is None:
+            self._slots[(min(origin, destination), max(origin, destination))] = (
+                len(self.edge_costs) + len(self._pending_costs))
+            self._pending_origins.append(int(origin))
+            self._pending_destinations.append(int(destination))
+            self._pending_costs.append(float(cost))
+            self._dirty = True
+            return None
+
+        stored = len(self.edge_costs)
+        if slot >= stored:
+            previous = self._pending_costs[slot - stored]
+            self._pending_costs[slot - stored] = float(cost)
+            return previous
+
+        previous = float(self.edge_costs[slot])
+        self.edge_costs[slot] = cost
+        if not self._dirty:
+            for u, v in ((origin, destination), (destination, origin)):
+                start, end = self.indptr[u], self.indptr[u + 1]
+                self.weights[start:end][self.indices[start:end] == v] = cost
+        return previous
+
+    def remove_edge(self, origin, destination):
+        """Elimina el vuelo entre dos nodos. Retorna False si no existía."""
+        slot = self._edge_slot(origin, destination)
+        if slot is None:
+            return False
+        self._flush_pending()
+        self.edge_origins = np.delete(self.edge_origins, slot)
+        self.edge_destinations = np.delete(self.edge_destinations, slot)
+        self.edge_costs = np.delete(self.edge_costs, slot)
+        # Las posiciones posteriores se corren; se recalculan cuando hagan falta.
+        self._slots = None
+        self._dirty = True
+        return True
+
+    def add_node(self, code, name, requires_visa: bool):
+        """Agrega un aeropuerto sin vuelos y retorna su identificador."""
+        node = len(self.codes)
+        self.codes.append(code)
+        self.names.append(name)
+        self.index[code] = node
+        self.requires_visa = np.append(self.requires_visa, bool(requires_visa))
+        self.active = np.append(self.active, True)
+        self.visa_free = self.active & ~self.requires_visa
+        self._dirty = True
+        return node
+
+    def remove_node(self, node):
+        """Desactiva un aeropuerto y elimina todos sus vuelos."""
+        del self.index[self.codes[node]]
+        self.active[node] = False
+        self.visa_free[node] = False
+        self._flush_pending()
+        keep = (self.edge_origins != node) & (self.edge_destinations != node)
+        self.edge_origins = self.edge_origins[keep]
+        self.edge_destinations = self.edge_destinations[keep]
+        self.edge_costs = self.edge_costs[keep]
+        self._slots = None
+        self._dirty = True
+
+    def set_requires_visa(self, node, requires_visa: bool):
+        """Cambia la restricción de visa de un aeropuerto; basta con actualizar las máscaras."""
+        self.requires_visa[node] = requires_visa
+        self.visa_free[node] = self.active[node] and not requires_visa
@@ -1,11 +1,45 @@
 import csv
+import json
+import os
+import tempfile
+from collections import namedtuple
 
-def read_destinations(filepath="destinos.txt"):
+import numpy as np
+
+from profiling import NULL_PROFILER
+
+# Tarifas en formato columnar: 'origins' y 'destinations' son índices enteros
+# sobre 'codes' y 'prices' es el arreglo de precios correspondiente.
+FareColumns = namedtuple('FareColumns', ['codes', 'origins', 'destinations', 'prices'])
+
+# Un lote de tarifas leído por iter_fare_batches; los índices son los del
+# diccionario code_index que recibe la función.
+FareBatch = namedtuple('FareBatch', ['origins', 'destinations', 'prices'])
+
+_FARE_CACHE_DTYPE = np.dtype([('origin', '<i4'), ('destination', '<i4'), ('price', '<f8')])
+
+def file_signature(filepath):
+    """
+    Retorna una firma (mtime en ns, tamaño) del archivo para detectar cambios,
+    o None si el archivo no existe.
+    """
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def read_destinations(filepath="destinos.txt", profiler=None):
     """
     Lee los datos de los destinos desde un archivo CSV.
     Retorna un diccionario donde la clave es el código del aeropuerto
     y el valor es un diccionario con 'nombre' y 'requiere_visa'.
+    profiler (opcional) registra la lectura como una operación.
     """
+    with (profiler or NULL_PROFILER).operation("read_destinations", path=filepath):
+        return _read_destinations(filepath)
+
+def _read_destinations(filepath):
     destinations_data = {}
     try:
         with open(filepath, mode='r', newline='', encoding='utf-8') as file:
@@ -23,11 +57,16 @@ def read_destinations(filepath="destinos.txt"):
         return None 
     return destinations_data
 
-def read_fares(filepath="tarifas.txt"):
+def read_fares(filepath="tarifas.txt", profiler=None):
     """
     Lee los datos de las tarifas desde un archivo CSV.
     Retorna una lista de diccionarios, donde cada diccionario representa un vuelo.
+    profiler (opcional) registra la lectura como una operación.
     """
+    with (profiler or NULL_PROFILER).operation("read_fares", path=filepath):
+        return _read_fares(filepath)
+
+def _read_fares(filepath):
     fares_data = []
     try:
         with open(filepath, mode='r', newline='', encoding='utf-8') as file:
@@ -47,4 +86,139 @@ def read_fares(filepath="tarifas.txt"):
     except FileNotFoundError:
         print(f"Error: El archivo '{filepath}' no se encontró. Asegúrate de que esté en el mismo directorio.")
         return None
-    return fares_data
\ No newline at end of file
+    return fares_data
+
+def iter_fare_batches(filepath="tarifas.txt", code_index=None, batch_size=65536):
+    """
+    Lee las tarifas en lotes de hasta batch_size filas sin cargar el archivo
+    completo en memoria. Cada código de aeropuerto se interna en code_index
+    (código -> entero), que se actualiza a medida que aparecen códigos nuevos.
+    Produce objetos FareBatch con arreglos NumPy de origen, destino y precio.
+    """
+    if code_index is None:
+        code_index = {}
+    origins, destinations, prices = [], [], []
+    with open(filepath, mode='r', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        for row in reader:
+            if len(row) != 3:
+                continue
+            origin, destination, price_str = row
+            try:
+                price = float(price_str.strip().replace('$', '').replace(',', ''))
+            except ValueError:
+                print(f"Advertencia: No se pudo parsear el precio '{price_str}' en la fila: {row}")
+                continue
+            origins.append(code_index.setdefault(origin.strip(), len(code_index)))
+            destinations.append(code_index.setdefault(destination.strip(), len(code_index)))
+            prices.append(price)
+            if len(prices) >= batch_size:
+                yield FareBatch(np.array(origins, dtype=np.int32), np.array(destinations, dtype=np.int32),
+                                np.array(prices, dtype=np.float64))
+                origins, destinations, prices = [], [], []
+    if prices:
+        yield FareBatch(np.array(origins, dtype=np.int32), np.array(destinations, dtype=np.int32),
+                        np.array(prices, dtype=np.float64))
+
+def remap_fare_columns(columns, code_index):
+    """
+    Traduce los índices de un FareColumns a los enteros de code_index y
+    descarta los vuelos cuyos aeropuertos no están en code_index.
+    Retorna (origenes, destinos, precios) como arreglos NumPy.
+    """
+    remap = np.array([code_index.get(code, -1) for code in columns.codes], dtype=np.int32)
+    origins = remap[np.asarray(columns.origins)] if len(remap) else np.empty(0, dtype=np.int32)
+    destinations = remap[np.asarray(columns.destinations)] if len(remap) else np.empty(0, dtype=np.int32)
+    valid = (origins >= 0) & (destinations >= 0)
+    dropped = len(valid) - int(valid.sum())
+    if dropped:
+        print(f"Advertencia: {dropped} vuelos no añadidos, uno o ambos aeropuertos no existen en la lista de destinos.")
+    return origins[valid], destinations[valid], np.asarray(columns.prices, dtype=np.float64)[valid]
+
+def _fare_cache_paths(filepath):
+    return f"{filepath}.cache.npy", f"{filepath}.cache.json"
+
+def _read_fare_cache(filepath, signature):
+    """Retorna las tarifas del caché binario si corresponde a la firma dada, o None."""
+    data_path, meta_path = _fare_cache_paths(filepath)
+    try:
+        with open(meta_path, mode='r', encoding='utf-8') as file:
+            meta = json.load(file)
+        if tuple(meta['signature']) != signature:
+            return None
+        records = np.load(data_path, mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        return None
+    if records.dtype != _FARE_CACHE_DTYPE:
+        return None
+    return FareColumns(meta['codes'], records['origin'], records['destination'], records['price'])
+
+def _make_temp_file(path):
+    """Crea un temporal único junto a path. Retorna (descriptor, ruta)."""
+    return tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+
+def _write_fare_cache(filepath, signature, columns):
+    """Guarda las tarifas en un archivo .npy mapeable en memoria junto con sus metadatos."""
+    data_path, meta_path = _fare_cache_paths(filepath)
+    records = np.empty(len(columns.prices), dtype=_FARE_CACHE_DTYPE)
+    records['origin'] = columns.origins
+    records['destination'] = columns.destinations
+    records['price'] = columns.prices
+    # Cada escritor usa sus propios temporales: varios procesos pueden
+    # regenerar el caché del mismo archivo a la vez.
+    temp_paths = []
+    try:
+        handle, temp_path = _make_temp_file(data_path)
+        temp_paths.append(temp_path)
+        with os.fdopen(handle, mode='wb') as file:
+            np.save(file, records)
+        handle, temp_path = _make_temp_file(meta_path)
+        temp_paths.append(temp_path)
+        with os.fdopen(handle, mode='w', encoding='utf-8') as file:
+            json.dump({'signature': list(signature), 'codes': columns.codes}, file)
+        os.replace(temp_paths[0], data_path)
+        os.replace(temp_paths[1], meta_path)
+    except OSError as e:
+        print(f"Advertencia: No se pudo escribir el caché de tarifas '{data_path}': {e}")
+        for temp_path in temp_paths:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+def load_fare_columns(filepath="tarifas.txt", use_cache=True, batch_size=65536, profiler=None):
+    """
+    Lee las tarifas en formato columnar (FareColumns).
+    Si use_cache es True, reutiliza un caché binario mapeable en memoria
+    mientras el archivo de origen no cambie (misma fecha de modificación y
+    tamaño); en caso contrario lee el archivo por lotes y regenera el caché.
+    profiler (opcional) registra las etapas de la carga y si se usó el caché.
+    """
+    profiler = profiler or NULL_PROFILER
+    with profiler.operation("load_fare_columns", path=filepath):
+        signature = file_signature(filepath)
+        if signature is None:
+            print(f"Error: El archivo '{filepath}' no se encontró. Asegúrate de que esté en el mismo directorio.")
+            return None
+        if use_cache:
+            with profiler.stage("lectura_cache"):
+                cached = _read_fare_cache(filepath, signature)
+            if cached is not None:
+                profiler.note(fare_cache="hit", fares=len(cached.prices))
+                return cached
+            profiler.note(fare_cache="miss")
+
+        with profiler.stage("lectura_lotes"):
+            code_index = {}
+            batches = list(iter_fare_batches(filepath, code_index, batch_size))
+            columns = FareColumns(
+                list(code_index),
+                np.concatenate([b.origins for b in batches]) if batches else np.empty(0, dtype=np.int32),
+                np.concatenate([b.destinations for b in batches]) if batches else np.empty(0, dtype=np.int32),
+                np.concatenate([b.prices for b in batches]) if batches else np.empty(0, dtype=np.float64),
+            )
+        profiler.note(fares=len(columns.prices))
+        if use_cache:
+            with profiler.stage("escritura_cache"):
+                _write_fare_cache(filepath, signature, columns)
+        return columns
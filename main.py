@@ -1,13 +1,13 @@
 import customtkinter as ctk
+import sys
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import messagebox
-from data_loader import read_destinations, read_fares
 from travel_graph import TravelGraph
 
-# Importar para incrustar Matplotlib en Tkinter
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-import matplotlib
+# Matplotlib, networkx y route_map se importan al dibujar por primera vez
+# (o en segundo plano, al cargar los datos) para que la ventana aparezca sin
+# esperar esas importaciones.
 
 # Configuración de customtkinter
 ctk.set_appearance_mode("System")  
@@ -24,22 +24,86 @@ class MetroTravelApp(ctk.CTk):
         # Configurar el protocolo de cierre de la ventana
         self.protocol("WM_DELETE_WINDOW", self.on_closing) 
 
-        # Cargar datos al inicio de la aplicación
-        self.destinations_data = read_destinations()
-        self.fares_data = read_fares()
+        # Las búsquedas corren en un hilo aparte para no bloquear la ventana.
+        # Un único hilo evita que dos búsquedas usen las cachés del grafo a la vez.
+        self.search_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="busqueda")
+        self.search_future = None
+        self.search_request_id = 0
 
-        if self.destinations_data is None or self.fares_data is None:
-            messagebox.showerror("Error de Carga", "Error al cargar los datos. Asegúrate de que 'destinos.txt' y 'tarifas.txt' existan y estén correctamente formateados.")
-            self.destroy() 
+        # Los datos se cargan en el hilo de búsqueda después de mostrar la
+        # ventana; mientras tanto los controles quedan deshabilitados.
+        self.destinations_data = {}
+        self.travel_graph_instance = None
+        self.airport_codes = []
+
+        self.create_widgets()
+        self.set_controls_enabled(False)
+        self.after_idle(self.start_loading)
+
+    def start_loading(self):
+        """Carga los datos, construye el grafo y calcula su disposición en segundo plano."""
+        self.path_text.configure(state="normal")
+        self.path_text.delete("0.0", "end")
+        self.path_text.insert("0.0", "Cargando destinos y tarifas...")
+        self.path_text.configure(state="disabled")
+
+        future = self.search_executor.submit(self.load_data, self.visa_var.get())
+        self.after(20, self.poll_loading, future)
+
+    @staticmethod
+    def load_data(has_visa):
+        """
+        Lee los archivos y construye el grafo (en el hilo de búsqueda).
+        Retorna el TravelGraph, o None si no se pudieron cargar los datos.
+        """
+        graph = TravelGraph.from_files()
+        if graph.destinations is None or graph.fares is None:
+            return None
+        # Adelanta la disposición del grafo y la importación de Matplotlib,
+        # que de otro modo se harían al dibujar por primera vez.
+        graph.get_layout(has_visa)
+        import route_map  # noqa: F401
+        from matplotlib.backends import backend_tkagg  # noqa: F401
+        return graph
+
+    def poll_loading(self, future):
+        """Revisa desde el bucle de Tkinter si terminó la carga de datos."""
+        if not future.done():
+            self.after(20, self.poll_loading, future)
+            return
+        try:
+            graph, error = future.result(), None
+        except Exception as e:
+            graph, error = None, e
+        if graph is None:
+            message = "Error al cargar los datos. Asegúrate de que 'destinos.txt' y 'tarifas.txt' existan y estén correctamente formateados."
+            messagebox.showerror("Error de Carga", message if error is None else f"{message}\n{error}")
+            self.search_executor.shutdown(wait=False, cancel_futures=True)
+            self.destroy()
             return
 
-        self.travel_graph_instance = TravelGraph(self.destinations_data, self.fares_data)
+        self.travel_graph_instance = graph
+        self.destinations_data = graph.destinations
 
         # Obtener la lista de códigos de aeropuerto para los comboboxes
         self.airport_codes = sorted(list(self.destinations_data.keys()))
+        self.origin_combobox.configure(values=self.airport_codes)
+        self.destination_combobox.configure(values=self.airport_codes)
 
-        self.create_widgets()
-        self.draw_initial_graph() 
+        self.path_text.configure(state="normal")
+        self.path_text.delete("0.0", "end")
+        self.path_text.insert("0.0", "Selecciona Origen y Destino, luego elige una opción de búsqueda.")
+        self.path_text.configure(state="disabled")
+
+        self.set_controls_enabled(True)
+        self.draw_initial_graph()
+
+    def set_controls_enabled(self, enabled):
+        """Habilita o deshabilita los controles que necesitan el grafo cargado."""
+        state = "normal" if enabled else "disabled"
+        for widget in (self.origin_combobox, self.destination_combobox, self.visa_checkbox,
+                       self.max_stops_combobox, self.cost_button, self.stops_button):
+            widget.configure(state=state)
 
     def on_closing(self):
         """
@@ -48,7 +112,9 @@ class MetroTravelApp(ctk.CTk):
         """
         if messagebox.askokcancel("Cerrar Aplicación", "¿Estás seguro de que quieres salir?"):
             
-            plt.close('all') 
+            if 'matplotlib.pyplot' in sys.modules:
+                sys.modules['matplotlib.pyplot'].close('all')
+            self.search_executor.shutdown(wait=False, cancel_futures=True)
             self.quit() 
             self.destroy() 
 
@@ -82,22 +148,28 @@ class MetroTravelApp(ctk.CTk):
         self.destination_combobox.grid(row=1, column=1, padx=10, pady=5, sticky="ew")
 
         self.visa_var = ctk.BooleanVar(value=False)
-        ctk.CTkCheckBox(input_frame, text="Tengo Visa", variable=self.visa_var, 
-                        command=self.on_visa_checkbox_toggle).grid(row=2, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+        self.visa_checkbox = ctk.CTkCheckBox(input_frame, text="Tengo Visa", variable=self.visa_var, 
+                                             command=self.on_visa_checkbox_toggle)
+        self.visa_checkbox.grid(row=2, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+
+        ctk.CTkLabel(input_frame, text="Máx. escalas:").grid(row=3, column=0, padx=10, pady=5, sticky="w")
+        self.max_stops_combobox = ctk.CTkComboBox(input_frame, values=["Sin límite", "1", "2", "3", "4"])
+        self.max_stops_combobox.grid(row=3, column=1, padx=10, pady=5, sticky="ew")
+        self.max_stops_combobox.set("Sin límite")
 
         input_frame.grid_columnconfigure(1, weight=1)
 
         # Botones de acción
         button_frame = ctk.CTkFrame(input_frame, fg_color="transparent")
-        button_frame.grid(row=3, column=0, columnspan=2, pady=10, sticky="ew")
+        button_frame.grid(row=4, column=0, columnspan=2, pady=10, sticky="ew")
         button_frame.columnconfigure(0, weight=1)
         button_frame.columnconfigure(1, weight=1)
 
-        cost_button = ctk.CTkButton(button_frame, text="Ruta más Barata", command=self.find_cheapest_route)
-        cost_button.grid(row=0, column=0, padx=5, pady=5, sticky="ew")
+        self.cost_button = ctk.CTkButton(button_frame, text="Ruta más Barata", command=self.find_cheapest_route)
+        self.cost_button.grid(row=0, column=0, padx=5, pady=5, sticky="ew")
 
-        stops_button = ctk.CTkButton(button_frame, text="Menos Escalas", command=self.find_fewest_stops_route)
-        stops_button.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        self.stops_button = ctk.CTkButton(button_frame, text="Menos Escalas", command=self.find_fewest_stops_route)
+        self.stops_button.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
 
         # Área de resultados
         results_frame = ctk.CTkFrame(controls_results_frame)
@@ -119,33 +191,38 @@ class MetroTravelApp(ctk.CTk):
         
         self.canvas = None 
         self.toolbar = None 
+        self.route_map = None
 
-    def draw_graph(self, origin=None, destination=None, path=None):
+    def draw_graph(self, origin=None, destination=None, path=None, highlight=None, network=None):
         """
         Dibuja el grafo en la interfaz de usuario.
+        highlight y network pueden traer los resultados de
+        RouteMap.prepare_highlight y RouteMap.prepare_network ya calculados en
+        el hilo de búsqueda; así aquí solo se reemplazan los artistas.
         """
-        # Eliminar el gráfico anterior si existe
-        if self.canvas:
-            self.canvas.get_tk_widget().destroy()
-            plt.close(self.canvas.figure) 
-        if self.toolbar:
-            self.toolbar.destroy()
-
-        fig = self.travel_graph_instance.draw_graph_with_path(
-            origin_node=origin, 
-            destination_node=destination, 
-            path_nodes=path, 
-            has_visa=self.visa_var.get()
-        )
-
-        self.canvas = FigureCanvasTkAgg(fig, master=self.graph_frame)
-        self.canvas_widget = self.canvas.get_tk_widget()
-        self.canvas_widget.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
-        self.canvas.draw()
-
-        self.toolbar = NavigationToolbar2Tk(self.canvas, self.graph_frame)
-        self.toolbar.update()
-        self.canvas_widget.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        # La figura, el canvas y la barra de herramientas se crean una sola vez;
+        # las consultas siguientes solo actualizan la ruta resaltada.
+        if self.canvas is None:
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+            from route_map import RouteMap
+
+            self.route_map = RouteMap(self.travel_graph_instance)
+            self.canvas = FigureCanvasTkAgg(self.route_map.figure, master=self.graph_frame)
+            self.canvas_widget = self.canvas.get_tk_widget()
+            self.canvas_widget.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+
+            self.toolbar = NavigationToolbar2Tk(self.canvas, self.graph_frame)
+            self.toolbar.update()
+            self.canvas_widget.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+
+        if network is None:
+            network = self.route_map.prepare_network(self.visa_var.get())
+        redrawn = self.route_map.apply_network(network)
+        if highlight is None or redrawn:
+            self.route_map.highlight(origin, destination, path)
+        else:
+            self.route_map.apply_highlight(highlight)
+        self.canvas.draw_idle()
 
     def draw_initial_graph(self):
         """Dibuja el grafo completo al iniciar la aplicación."""
@@ -156,14 +233,66 @@ class MetroTravelApp(ctk.CTk):
         Función llamada cuando el checkbox 'Tengo Visa' cambia de estado.
         Redibuja el grafo para reflejar las nuevas restricciones.
         """
+        # Los resultados pendientes ya no corresponden al estado de la visa;
+        # redraw_network reemplaza la búsqueda en curso.
+        self.redraw_network(message="El estado de la visa ha cambiado. Recalcula la ruta.")
+
+    def redraw_network(self, origin=None, destination=None, message=None):
+        """
+        Prepara en el hilo de búsqueda la red del estado de visa actual
+        (grafo filtrado y disposición, que pueden tardar en redes grandes) y
+        la dibuja al terminar. message se muestra mientras tanto.
+        """
+        has_visa = self.visa_var.get()
+        self.run_search(lambda: self.route_map.prepare_network(has_visa),
+                        lambda network: self.draw_graph(origin, destination, None, network=network))
+        if message is not None:
+            self.path_text.configure(state="normal")
+            self.path_text.delete("0.0", "end")
+            self.path_text.insert("0.0", message)
+            self.path_text.configure(state="disabled")
+
+    def run_search(self, search, on_result):
+        """
+        Ejecuta search() en el hilo de búsqueda y luego on_result(resultado)
+        en el hilo de Tkinter. Una búsqueda nueva reemplaza a la anterior: si
+        aún no empezó se cancela y, si ya terminó, su resultado se descarta.
+        """
+        self.cancel_pending_search()
+        request_id = self.search_request_id
+        self.search_future = self.search_executor.submit(search)
+
         self.path_text.configure(state="normal")
         self.path_text.delete("0.0", "end")
-        self.path_text.insert("0.0", "El estado de la visa ha cambiado. Recalcula la ruta.")
+        self.path_text.insert("0.0", "Buscando ruta...")
         self.path_text.configure(state="disabled")
 
-        self.draw_graph(origin=None, destination=None, path=None)
+        self.after(20, self.poll_search, self.search_future, request_id, on_result)
 
-    def update_results_display(self, result_type, value, path_list, extra_routes=None):
+    def cancel_pending_search(self):
+        """Invalida la búsqueda en curso para que su resultado no se muestre."""
+        self.search_request_id += 1
+        if self.search_future is not None:
+            self.search_future.cancel()
+            self.search_future = None
+
+    def poll_search(self, future, request_id, on_result):
+        """Revisa desde el bucle de Tkinter si la búsqueda terminó."""
+        if request_id != self.search_request_id:
+            return
+        if not future.done():
+            self.after(20, self.poll_search, future, request_id, on_result)
+            return
+        self.search_future = None
+        try:
+            result = future.result()
+        except Exception as e:
+            self.update_results_display("error", None, f"Error al calcular la ruta: {e}")
+            return
+        on_result(result)
+
+    def update_results_display(self, result_type, value, path_list, extra_routes=None,
+                               origin=None, destination=None, highlight=None, network=None):
         self.path_text.configure(state="normal")
         self.path_text.delete("0.0", "end")
         if value is None:
@@ -183,16 +312,25 @@ class MetroTravelApp(ctk.CTk):
             elif result_type == "escalas":
                 self.path_text.insert("0.0", f"Número de Escalas: {value}\nRuta: {path_str}")
             
-            origin = self.origin_combobox.get()
-            destination = self.destination_combobox.get()
-            self.draw_graph(origin=origin, destination=destination, path=path_list)
+            if origin is None:
+                origin = self.origin_combobox.get()
+            if destination is None:
+                destination = self.destination_combobox.get()
+            self.draw_graph(origin=origin, destination=destination, path=path_list, highlight=highlight,
+                            network=network)
 
         self.path_text.configure(state="disabled")
 
+    def get_max_stops(self):
+        """Retorna el límite de escalas elegido, o None si no hay límite."""
+        value = self.max_stops_combobox.get().strip()
+        return int(value) if value.isdigit() else None
+
     def find_cheapest_route(self):
         origin = self.origin_combobox.get()
         destination = self.destination_combobox.get()
         has_visa = self.visa_var.get()
+        max_stops = self.get_max_stops()
 
         if not origin or not destination:
             messagebox.showerror("Error de Entrada", "Por favor, selecciona un Origen y un Destino.")
@@ -203,17 +341,28 @@ class MetroTravelApp(ctk.CTk):
 
         if not has_visa and self.destinations_data.get(destination, {}).get('requiere_visa', False):
             messagebox.showerror("Viaje No Permitido", f"No puedes viajar a {self.destinations_data[destination]['name']} sin visa.")
-            self.update_results_display("error", None, "Viaje no permitido sin visa.")
-            self.draw_graph(origin=origin, destination=destination, path=None) 
+            self.redraw_network(origin, destination, message="Viaje no permitido sin visa.")
             return
 
-        rutas = self.travel_graph_instance.find_k_shortest_paths_cost(origin, destination, has_visa, k=4)
-        if rutas and rutas[0][0] is not None:
-            costo, ruta = rutas[0]
-            extra_rutas = rutas[1:] if len(rutas) > 1 else None
-            self.update_results_display("costo", costo, ruta, extra_routes=extra_rutas)
-        else:
-            self.update_results_display("costo", None, rutas[0][1])
+        def search():
+            rutas = self.travel_graph_instance.find_k_shortest_paths_cost(origin, destination, has_visa, k=4,
+                                                                          max_stops=max_stops)
+            ruta = rutas[0][1] if rutas and rutas[0][0] is not None else None
+            network = self.route_map.prepare_network(has_visa)
+            return rutas, self.route_map.prepare_highlight(origin, destination, ruta), network
+
+        def show(result):
+            rutas, highlight, network = result
+            if rutas and rutas[0][0] is not None:
+                costo, ruta = rutas[0]
+                extra_rutas = rutas[1:] if len(rutas) > 1 else None
+                self.update_results_display("costo", costo, ruta, extra_routes=extra_rutas,
+                                            origin=origin, destination=destination, highlight=highlight,
+                                            network=network)
+            else:
+                self.update_results_display("costo", None, rutas[0][1])
+
+        self.run_search(search, show)
 
     def find_fewest_stops_route(self):
         origin = self.origin_combobox.get()
@@ -229,25 +378,35 @@ class MetroTravelApp(ctk.CTk):
         
         if not has_visa and self.destinations_data.get(destination, {}).get('requiere_visa', False):
             messagebox.showerror("Viaje No Permitido", f"No puedes viajar a {self.destinations_data[destination]['name']} sin visa.")
-            self.update_results_display("error", None, "Viaje no permitido sin visa.")
-            self.draw_graph(origin=origin, destination=destination, path=None) 
+            self.redraw_network(origin, destination, message="Viaje no permitido sin visa.")
             return
 
-        stops, path = self.travel_graph_instance.find_shortest_path_stops(origin, destination, has_visa)
-        if stops is not None and isinstance(path, list):
-            # Calcular el costo total de la ruta encontrada
-            current_graph = self.travel_graph_instance.get_filtered_graph(has_visa)
-            total_cost = 0
-            for i in range(len(path)-1):
-                total_cost += current_graph[path[i]][path[i+1]]['cost']
-            self.path_text.configure(state="normal")
-            self.path_text.delete("0.0", "end")
-            path_str = " -> ".join(path)
-            self.path_text.insert("0.0", f"Número de Escalas: {stops}\nCosto Total: ${total_cost:.2f}\nRuta: {path_str}")
-            self.draw_graph(origin=origin, destination=destination, path=path)
-            self.path_text.configure(state="disabled")
-        else:
-            self.update_results_display("escalas", None, path)
+        def search():
+            # Rutas no dominadas en (costo, escalas); la última es la de menos escalas.
+            routes = self.travel_graph_instance.find_pareto_routes(origin, destination, has_visa)
+            path = routes[-1][2] if routes[-1][1] is not None else None
+            network = self.route_map.prepare_network(has_visa)
+            return routes, self.route_map.prepare_highlight(origin, destination, path), network
+
+        def show(result):
+            routes, highlight, network = result
+            total_cost, stops, path = routes[-1]
+            if stops is not None and isinstance(path, list):
+                self.path_text.configure(state="normal")
+                self.path_text.delete("0.0", "end")
+                path_str = " -> ".join(path)
+                self.path_text.insert("0.0", f"Número de Escalas: {stops}\nCosto Total: ${total_cost:.2f}\nRuta: {path_str}\n")
+                if len(routes) > 1:
+                    self.path_text.insert("end", "\nOpciones más baratas con más escalas:\n")
+                    for cost, other_stops, other_path in reversed(routes[:-1]):
+                        self.path_text.insert("end", f"{other_stops} escalas: ${cost:.2f} | {' -> '.join(other_path)}\n")
+                self.draw_graph(origin=origin, destination=destination, path=path, highlight=highlight,
+                                network=network)
+                self.path_text.configure(state="disabled")
+            else:
+                self.update_results_display("escalas", None, path)
+
+        self.run_search(search, show)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,185 @@
+"""
+Instrumentación opcional de las consultas de TravelGraph y de la carga de datos.
+
+Un QueryProfiler registra, por cada operación (una consulta, una carga de
+archivos, un dibujo), el tiempo total y el de cada etapa, los nodos y aristas
+recorridos por la búsqueda, si la respuesta vino de una caché y, si se pide,
+el pico de memoria. Los registros recientes quedan en memoria para stats() y
+pueden escribirse además como JSON, uno por línea.
+
+Sin profiler se usa NULL_PROFILER, cuyos métodos no hacen nada, de modo que
+el costo de la instrumentación desactivada es una llamada por etapa.
+"""
+import json
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+_NULL_CONTEXT = nullcontext()
+
+
+class NullProfiler:
+    """Profiler desactivado: todas las operaciones son vacías."""
+
+    enabled = False
+
+    def operation(self, name, **fields):
+        return _NULL_CONTEXT
+
+    def stage(self, name):
+        return _NULL_CONTEXT
+
+    def note(self, **fields):
+        pass
+
+    def count_neighbors(self, neighbors):
+        return neighbors
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class QueryProfiler:
+    """
+    Registra tiempos por etapa, nodos y aristas explorados, aciertos de caché
+    y pico de memoria de cada operación.
+    log puede ser una ruta o un archivo abierto donde se escribe cada registro
+    como una línea JSON. Con trace_memory se mide el pico de memoria de cada
+    operación con tracemalloc (más costoso). Se conservan los últimos
+    'history' registros.
+    """
+
+    enabled = True
+
+    def __init__(self, log=None, trace_memory=False, history=1000):
+        self.trace_memory = trace_memory
+        self.records = deque(maxlen=history)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._owns_log = isinstance(log, str)
+        self._log = open(log, mode='a', encoding='utf-8') if self._owns_log else log
+        self._started_tracemalloc = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def _current(self):
+        return getattr(self._local, 'record', None)
+
+    @contextmanager
+    def operation(self, name, **fields):
+        """
+        Abre el registro de una operación. Las operaciones anidadas (por
+        ejemplo, find_shortest_path_cost que llama a find_route) se suman al
+        registro de la operación exterior.
+        """
+        if self._current() is not None:
+            yield self._current()
+            return
+
+        record = {'operation': name, **fields, 'stages': {}, 'nodes_explored': 0, 'edges_explored': 0}
+        self._local.record = record
+        memory_base = None
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            memory_base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['total_s'] = time.perf_counter() - start
+            if memory_base is not None:
+                record['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1] - memory_base
+            self._local.record = None
+            self._finish(record)
+
+    @contextmanager
+    def stage(self, name):
+        """Suma el tiempo del bloque a la etapa 'name' de la operación en curso."""
+        record = self._current()
+        if record is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stages = record['stages']
+            stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+    def note(self, **fields):
+        """Agrega campos (por ejemplo, cache='hit') al registro en curso."""
+        record = self._current()
+        if record is not None:
+            record.update(fields)
+
+    def count_neighbors(self, neighbors):
+        """
+        Envuelve una función de vecinos para contar los nodos expandidos y las
+        aristas recorridas en la operación en curso.
+        """
+        record = self._current()
+        if record is None:
+            return neighbors
+
+        def counted(node):
+            items = list(neighbors(node))
+            record['nodes_explored'] += 1
+            record['edges_explored'] += len(items)
+            return items
+
+        return counted
+
+    def _finish(self, record):
+        with self._lock:
+            self.records.append(record)
+            if self._log is not None:
+                self._log.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                self._log.flush()
+
+    def stats(self):
+        """
+        Resume los registros guardados por operación: cantidad, tiempo total y
+        medio, tiempo por etapa, nodos y aristas explorados, aciertos y fallos
+        de caché y el mayor pico de memoria medido.
+        """
+        with self._lock:
+            records = list(self.records)
+        summary = {}
+        for record in records:
+            entry = summary.setdefault(record['operation'], {
+                'count': 0, 'total_s': 0.0, 'stages': {}, 'nodes_explored': 0, 'edges_explored': 0,
+                'cache_hits': 0, 'cache_misses': 0, 'peak_memory_bytes': None,
+            })
+            entry['count'] += 1
+            entry['total_s'] += record['total_s']
+            entry['nodes_explored'] += record['nodes_explored']
+            entry['edges_explored'] += record['edges_explored']
+            for name, seconds in record['stages'].items():
+                entry['stages'][name] = entry['stages'].get(name, 0.0) + seconds
+            for field in ('cache', 'fare_cache'):
+                if record.get(field) == "hit":
+                    entry['cache_hits'] += 1
+                elif record.get(field) == "miss":
+                    entry['cache_misses'] += 1
+            if 'peak_memory_bytes' in record:
+                entry['peak_memory_bytes'] = max(entry['peak_memory_bytes'] or 0, record['peak_memory_bytes'])
+        for entry in summary.values():
+            entry['mean_s'] = entry['total_s'] / entry['count']
+        return summary
+
+    def reset(self):
+        """Descarta los registros guardados."""
+        with self._lock:
+            self.records.clear()
+
+    def close(self):
+        """Cierra el log (si lo abrió el profiler) y detiene tracemalloc si lo inició."""
+        if self._owns_log and self._log is not None:
+            self._log.close()
+        self._log = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
@@ -0,0 +1,116 @@
+import networkx as nx
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+
+
+class RouteMap:
+    """
+    Mapa de rutas incrustable en Tkinter.
+    La red base (nodos, aristas y etiquetas) se dibuja una sola vez por grafo
+    filtrado; cada consulta solo cambia los colores y tamaños de los nodos y
+    los segmentos de la ruta resaltada sobre los artistas existentes.
+    """
+
+    def __init__(self, travel_graph, figure=None):
+        self.travel_graph = travel_graph
+        self.figure = figure if figure is not None else Figure(figsize=(6, 4))
+        self.ax = self.figure.add_subplot(111)
+        self._network_key = None
+        self._nodes = []
+        self._pos = {}
+        self._node_artist = None
+        self._path_artist = None
+
+    def show_network(self, has_visa: bool):
+        """
+        Dibuja la red base para el estado de visa dado si no es la que ya está
+        dibujada (o si el grafo cambió). Retorna True si se redibujó.
+        """
+        return self.apply_network(self.prepare_network(has_visa))
+
+    def prepare_network(self, has_visa: bool):
+        """
+        Obtiene el grafo filtrado, su disposición y las etiquetas de costo de
+        la red base, sin tocar la figura; puede correr fuera del hilo de la
+        interfaz. Retorna None si esa red ya está dibujada.
+        """
+        key = (has_visa, self.travel_graph.version)
+        if key == self._network_key:
+            return None
+        graph_to_draw = self.travel_graph.get_filtered_graph(has_visa)
+        pos = self.travel_graph.get_layout(has_visa)
+        return key, graph_to_draw, pos, nx.get_edge_attributes(graph_to_draw, 'cost')
+
+    def apply_network(self, network):
+        """
+        Dibuja la red base preparada por prepare_network. Retorna True si se
+        redibujó (False si network es None o ya está dibujada).
+        """
+        if network is None or network[0] == self._network_key:
+            return False
+        key, graph_to_draw, self._pos, edge_labels = network
+        self._nodes = list(graph_to_draw.nodes())
+        self._network_key = key
+
+        self.ax.clear()
+        # Aristas generales
+        nx.draw_networkx_edges(graph_to_draw, self._pos, edgelist=graph_to_draw.edges(),
+                               width=1.0, alpha=0.5, edge_color='gray', ax=self.ax)
+
+        # Aristas de la ruta resaltada, vacías hasta la primera consulta
+        self._path_artist = LineCollection([], colors='red', linewidths=3.0, zorder=1.5)
+        self.ax.add_collection(self._path_artist)
+
+        highlight = self.prepare_highlight(None, None, None)
+        self._node_artist = nx.draw_networkx_nodes(graph_to_draw, self._pos, nodelist=self._nodes,
+                                                   node_color=highlight[0], node_size=highlight[1],
+                                                   ax=self.ax, edgecolors='black')
+
+        # Etiquetas de nodos y costos de las aristas
+        nx.draw_networkx_labels(graph_to_draw, self._pos, font_size=9, font_weight='bold', ax=self.ax)
+        nx.draw_networkx_edge_labels(graph_to_draw, self._pos, edge_labels=edge_labels, font_size=8, ax=self.ax)
+
+        self.ax.set_title("Grafo de Rutas de Metro Travel")
+        self.ax.set_axis_on()
+        self.figure.tight_layout()
+        return True
+
+    def prepare_highlight(self, origin_node, destination_node, path_nodes=None):
+        """
+        Calcula los colores y tamaños de los nodos y los segmentos de la ruta
+        resaltada, sin tocar la figura.
+        Retorna (colores, tamaños, segmentos).
+        """
+        destinations = self.travel_graph.destinations
+        on_path = set(path_nodes or ())
+        colors, sizes = [], []
+        for node in self._nodes:
+            if node == origin_node:
+                colors.append('lightgreen') # Origen
+            elif node == destination_node:
+                colors.append('salmon') # Destino
+            elif node in on_path:
+                colors.append('gold') # Nodos de la ruta
+            elif destinations[node]['requiere_visa']:
+                colors.append('lightblue') # Nodos con visa (accesibles si tiene visa)
+            else:
+                colors.append('lightgray') # Otros nodos
+            sizes.append(1200 if node in on_path else 1000)
+
+        segments = []
+        if path_nodes:
+            for u, v in zip(path_nodes, path_nodes[1:]):
+                if u in self._pos and v in self._pos:
+                    segments.append([self._pos[u], self._pos[v]])
+        return colors, sizes, segments
+
+    def apply_highlight(self, highlight):
+        """Aplica sobre los artistas existentes el resultado de prepare_highlight."""
+        colors, sizes, segments = highlight
+        self._node_artist.set_facecolor(colors)
+        self._node_artist.set_sizes(sizes)
+        self._path_artist.set_segments(segments)
+
+    def highlight(self, origin_node, destination_node, path_nodes=None):
+        """Resalta la ruta indicada sobre la red ya dibujada."""
+        self.apply_highlight(self.prepare_highlight(origin_node, destination_node, path_nodes))
@@ -0,0 +1,206 @@
+"""
+Servicio HTTP/JSON local para consultar rutas sobre un TravelGraph compartido.
+
+El grafo se carga una sola vez al iniciar y las búsquedas corren en un
+ejecutor para no bloquear el bucle de asyncio. Las consultas idénticas que
+llegan mientras otra igual está en curso esperan ese mismo resultado.
+
+Rutas:
+    GET /route?origin=CCS&destination=SXM&has_visa=1&mode=costo|escalas
+    GET /routes?origin=CCS&destination=SXM&has_visa=1&k=4
+    GET /stats
+
+Uso:
+    python route_service.py --port 8765
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from travel_graph import TravelGraph
+
+_TRUE_VALUES = ("1", "true", "si", "sí", "yes")
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class RouteService:
+    """
+    Atiende consultas de rutas sobre un único TravelGraph.
+    workers es la cantidad de hilos de búsqueda; con uno solo las cachés del
+    grafo nunca se usan desde dos hilos a la vez. max_k limita las rutas que
+    puede pedir /routes, para que una sola consulta no ocupe la búsqueda.
+    """
+
+    def __init__(self, graph, workers=1, latency_window=1000, max_k=50):
+        self.graph = graph
+        self.max_k = max_k
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="busqueda")
+        self.requests = 0
+        self.coalesced = 0
+        self._inflight = {}
+        self._latencies = deque(maxlen=latency_window)
+
+    def warm_up(self):
+        """Prepara las vistas filtradas, tablas y landmarks del grafo antes de atender consultas."""
+        self.graph.warm_up()
+
+    async def run(self, key, function, *args):
+        """
+        Ejecuta function(*args) en el ejecutor. Si ya hay una consulta con la
+        misma clave en curso, espera su resultado en lugar de repetirla.
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, function, *args)
+        self._inflight[key] = future
+        future.add_done_callback(lambda done: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def route(self, origin, destination, has_visa, mode):
+        key = ("route", origin, destination, has_visa, mode)
+        cost, stops, path = await self.run(key, self.graph.find_route, origin, destination, has_visa, mode)
+        if cost is None:
+            return 404, {'error': path}
+        return 200, {'cost': cost, 'stops': stops, 'path': path}
+
+    async def routes(self, origin, destination, has_visa, k):
+        key = ("routes", origin, destination, has_visa, k)
+        results = await self.run(key, self.graph.find_k_shortest_paths_cost, origin, destination, has_visa, k)
+        if results and results[0][0] is None:
+            return 404, {'error': results[0][1]}
+        return 200, {'routes': [{'cost': cost, 'stops': len(path) - 1, 'path': path} for cost, path in results]}
+
+    def record_latency(self, seconds):
+        self.requests += 1
+        self._latencies.append(seconds)
+
+    def stats(self):
+        """Percentiles de latencia (en milisegundos) de las últimas consultas y contadores."""
+        samples = sorted(self._latencies)
+
+        def percentile(fraction):
+            if not samples:
+                return None
+            return samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000
+
+        return {
+            'requests': self.requests,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._inflight),
+            'latency_ms': {'p50': percentile(0.50), 'p90': percentile(0.90), 'p99': percentile(0.99),
+                           'max': samples[-1] * 1000 if samples else None},
+            'route_cache': self.graph.cache_stats(),
+            'profile': self.graph.profile_stats(),
+        }
+
+    async def dispatch(self, method, target):
+        """Resuelve una petición HTTP. Retorna (estado, cuerpo JSON)."""
+        if method != "GET":
+            return 405, {'error': "Solo se admite GET."}
+        url = urlsplit(target)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if url.path == "/stats":
+            return 200, self.stats()
+        if url.path not in ("/route", "/routes"):
+            return 404, {'error': f"Ruta desconocida: {url.path}"}
+
+        origin = params.get('origin', "").strip()
+        destination = params.get('destination', "").strip()
+        if not origin or not destination:
+            return 400, {'error': "Se requieren los parámetros 'origin' y 'destination'."}
+        has_visa = params.get('has_visa', "").strip().lower() in _TRUE_VALUES
+
+        if url.path == "/route":
+            mode = params.get('mode', "costo")
+            if mode not in ("costo", "escalas"):
+                return 400, {'error': f"Modo de búsqueda desconocido: {mode}"}
+            return await self.route(origin, destination, has_visa, mode)
+
+        try:
+            k = int(params.get('k', 4))
+        except ValueError:
+            return 400, {'error': "El parámetro 'k' debe ser un entero."}
+        if k < 1:
+            return 400, {'error': "El parámetro 'k' debe ser mayor que cero."}
+        if k > self.max_k:
+            return 400, {'error': f"El parámetro 'k' no puede ser mayor que {self.max_k}."}
+        return await self.routes(origin, destination, has_visa, k)
+
+    async def handle_connection(self, reader, writer):
+        """Atiende una petición HTTP/1.1 por conexión."""
+        start = time.perf_counter()
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2:
+                status, body = 400, {'error': "Petición inválida."}
+            else:
+                try:
+                    status, body = await self.dispatch(parts[0], parts[1])
+                except Exception as e:
+                    status, body = 500, {'error': f"Error al calcular la ruta: {e}"}
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            writer.write(
+                f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode('latin-1') + payload
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+            self.record_latency(time.perf_counter() - start)
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.warm_up)
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Servicio de rutas escuchando en http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP local de rutas de Metro Travel.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--destinos", default="destinos.txt", help="Archivo de destinos.")
+    parser.add_argument("--tarifas", default="tarifas.txt", help="Archivo de tarifas.")
+    parser.add_argument("--backend", choices=("networkx", "csr"), default="networkx")
+    parser.add_argument("--precompute", action="store_true", help="Precalcula las tablas de todos los pares.")
+    parser.add_argument("--algorithm", choices=("dijkstra", "bidirectional", "alt"), default="dijkstra",
+                        help="Algoritmo de las consultas punto a punto.")
+    parser.add_argument("--cache-size", type=int, default=4096, help="Tamaño de la caché LRU de rutas.")
+    parser.add_argument("--max-k", type=int, default=50, help="Máximo de rutas por consulta a /routes.")
+    parser.add_argument("--workers", type=int, default=1, help="Hilos de búsqueda.")
+    parser.add_argument("--profile", action="store_true", help="Registra tiempos por etapa de cada consulta.")
+    parser.add_argument("--profile-log", help="Archivo JSONL donde escribir cada registro del profiler.")
+    args = parser.parse_args(argv)
+
+    graph = TravelGraph.from_files(args.destinos, args.tarifas, precompute=args.precompute,
+                                   backend=args.backend, cache_size=args.cache_size,
+                                   search_algorithm=args.algorithm)
+    if graph.destinations is None or graph.fares is None:
+        parser.exit(1, f"Error: No se pudieron cargar los datos de '{args.destinos}' y '{args.tarifas}'.\n")
+    if args.profile or args.profile_log:
+        graph.enable_profiling(log=args.profile_log)
+    service = RouteService(graph, workers=args.workers, max_k=args.max_k)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
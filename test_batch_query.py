@@ -0,0 +1,44 @@
+import io
+
+import pytest
+
+from batch_query import main, read_queries, run_batch
+
+
+def test_malformed_lines_keep_their_position():
+    stream = io.StringIO('{"origin": "AUA", "destination": "CUR", "has_visa": true}\n'
+                         '{no es json\n'
+                         '{"origin": "CCS"}\n'
+                         '{"origin": "CCS", "destination": "CUR", "has_visa": true}\n')
+    results = list(run_batch(read_queries(stream), workers=1, chunk_size=2))
+    assert len(results) == 4
+    assert results[0]['path'] == ['AUA', 'CUR']
+    assert results[1]['line'] == 2 and 'error' in results[1]
+    assert results[2]['line'] == 3 and 'destination' in results[2]['error']
+    assert results[3]['origin'] == 'CCS' and 'cost' in results[3]
+
+
+def test_missing_data_files_fail_the_batch(tmp_path):
+    with pytest.raises(ValueError):
+        run_batch(iter([]), destinations_path=str(tmp_path / "destinos.txt"), workers=2)
+    queries = tmp_path / "consultas.jsonl"
+    queries.write_text('{"origin": "AUA", "destination": "CUR"}\n', encoding='utf-8')
+    output = tmp_path / "resultados.jsonl"
+    with pytest.raises(SystemExit) as exit_info:
+        main([str(queries), "-o", str(output), "--tarifas", str(tmp_path / "tarifas.txt"), "--workers", "1"])
+    assert exit_info.value.code == 1
+    assert not output.exists()
+
+
+@pytest.mark.parametrize("missing", ["queries", "output"])
+def test_unopenable_query_files_fail_the_batch(tmp_path, missing):
+    queries = tmp_path / "consultas.jsonl"
+    queries.write_text('{"origin": "AUA", "destination": "CUR"}\n', encoding='utf-8')
+    output = tmp_path / "resultados.jsonl"
+    if missing == "queries":
+        queries = tmp_path / "no_existe.jsonl"
+    else:
+        output = tmp_path / "no_existe" / "resultados.jsonl"
+    with pytest.raises(SystemExit) as exit_info:
+        main([str(queries), "-o", str(output), "--workers", "1"])
+    assert exit_info.value.code == 1
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+import pytest
+
+from route_service import RouteService, main
+from travel_graph import TravelGraph
+
+
+@pytest.fixture
+def service():
+    service = RouteService(TravelGraph.from_files("destinos.txt", "tarifas.txt", cache_size=0))
+    yield service
+    service.executor.shutdown()
+
+
+def test_identical_requests_share_one_search(service):
+    calls = []
+    release = threading.Event()
+    find_route = service.graph.find_route
+
+    def slow_find_route(*args):
+        calls.append(args)
+        release.wait(5)
+        return find_route(*args)
+
+    service.graph.find_route = slow_find_route
+
+    async def scenario():
+        target = "/route?origin=CCS&destination=SXM&has_visa=1"
+        requests = [asyncio.ensure_future(service.dispatch("GET", target)) for _ in range(2)]
+        while service.coalesced < 1:
+            await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.gather(*requests)
+
+    first, second = asyncio.run(scenario())
+    assert first == second and first[0] == 200
+    assert len(calls) == 1
+    assert service.stats()['coalesced'] == 1
+    assert service.stats()['in_flight'] == 0
+
+
+@pytest.mark.parametrize("target", [
+    "/route?origin=CCS&destination=SXM&mode=rapido",
+    "/route?origin=CCS",
+    "/routes?origin=CCS&destination=SXM&k=dos",
+    "/routes?origin=CCS&destination=SXM&k=0",
+    "/routes?origin=CCS&destination=SXM&k=1000000000",
+])
+def test_invalid_parameters_are_rejected(service, target):
+    status, body = asyncio.run(service.dispatch("GET", target))
+    assert status == 400 and 'error' in body
+
+
+@pytest.mark.parametrize("method, target, expected", [
+    ("GET", "/rutas", 404),
+    ("GET", "/route?origin=CCS&destination=XXX", 404),
+    ("POST", "/route?origin=CCS&destination=SXM", 405),
+])
+def test_unknown_paths_and_airports(service, method, target, expected):
+    status, body = asyncio.run(service.dispatch(method, target))
+    assert status == expected and 'error' in body
+
+
+def test_latency_percentiles(service):
+    assert service.stats()['latency_ms']['p50'] is None
+    for milliseconds in range(100, 0, -1):
+        service.record_latency(milliseconds / 1000)
+    latency = service.stats()['latency_ms']
+    assert latency['p50'] == pytest.approx(51)
+    assert latency['p90'] == pytest.approx(91)
+    assert latency['p99'] == pytest.approx(100)
+    assert latency['max'] == pytest.approx(100)
+    assert service.stats()['requests'] == 100
+
+
+def test_missing_data_files_stop_the_service(tmp_path):
+    with pytest.raises(SystemExit) as exit_info:
+        main(["--destinos", str(tmp_path / "destinos.txt"), "--port", "0"])
+    assert exit_info.value.code == 1
@@ -0,0 +1,254 @@
+import math
+import random
+from itertools import islice
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from benchmark import generate_network
+from travel_graph import TravelGraph
+
+
+@pytest.fixture(params=["networkx", "csr"])
+def bundled_graph(request):
+    return TravelGraph.from_files("destinos.txt", "tarifas.txt", backend=request.param)
+
+
+def test_max_stops_and_k_paths_do_not_share_cache_entries(bundled_graph):
+    cost, stops, path = bundled_graph.find_cheapest_route_max_stops('CCS', 'SXM', True, 2)
+    routes = bundled_graph.find_k_shortest_paths_cost('CCS', 'SXM', True, k=1, max_stops=2)
+    assert routes[0][0] == cost and len(routes[0][1]) - 1 <= 2
+    assert bundled_graph.find_cheapest_route_max_stops('CCS', 'SXM', True, 2) == (cost, stops, path)
+
+
+@pytest.mark.parametrize("backend", ["networkx", "csr"])
+@pytest.mark.parametrize("mode", ["costo", "escalas"])
+def test_fare_matrix_does_not_depend_on_worker_count(backend, mode):
+    graph = TravelGraph.from_files("destinos.txt", "tarifas.txt", backend=backend)
+    # Las ediciones cambian el orden de la adyacencia respecto del grafo que
+    # reconstruyen los procesos.
+    graph.set_fare('SBH', 'CUR', 10.0)
+    graph.remove_fare('CCS', 'AUA')
+    graph.set_fare('CCS', 'AUA', 40.0)
+    for has_visa in (True, False):
+        serial = graph.fare_matrix(has_visa=has_visa, mode=mode)
+        parallel = graph.fare_matrix(has_visa=has_visa, mode=mode, workers=2)
+        assert serial.origins == parallel.origins
+        assert np.array_equal(serial.costs, parallel.costs)
+        assert np.array_equal(serial.stops, parallel.stops)
+
+
+def _synthetic_data(num_airports=40, seed=7):
+    destinations_rows, fares_rows = generate_network(num_airports, average_degree=4.0, visa_fraction=0.3, seed=seed)
+    destinations = {code: {'name': name, 'requiere_visa': visa == "Requiere Visa"}
+                    for code, name, visa in destinations_rows}
+    fares = {(origin, destination): float(price) for origin, destination, price in fares_rows}
+    return destinations, fares
+
+
+def _build(destinations, fares, **options):
+    fares_data = [{'origin': u, 'destination': v, 'price': price} for (u, v), price in fares.items()]
+    return TravelGraph({code: dict(data) for code, data in destinations.items()}, fares_data, **options)
+
+
+def _reference_graph(destinations, fares, has_visa):
+    graph = nx.Graph()
+    graph.add_nodes_from(code for code, data in destinations.items() if has_visa or not data['requiere_visa'])
+    graph.add_edges_from((u, v, {'cost': price}) for (u, v), price in fares.items() if u in graph and v in graph)
+    return graph
+
+
+def _pairs(codes, count=25, seed=3):
+    rng = random.Random(seed)
+    return [tuple(rng.sample(sorted(codes), 2)) for _ in range(count)]
+
+
+def _assert_same_route(result, expected, mode):
+    cost, stops, path = result
+    expected_cost, expected_stops, _ = expected
+    if expected_cost is None:
+        assert cost is None
+        return
+    # Entre rutas empatadas puede elegirse cualquiera: se compara solo el
+    # criterio del modo.
+    if mode == "costo":
+        assert cost == pytest.approx(expected_cost)
+    else:
+        assert stops == expected_stops
+    assert len(path) - 1 == stops
+
+
+@pytest.mark.parametrize("backend", ["networkx", "csr"])
+@pytest.mark.parametrize("algorithm", ["dijkstra", "bidirectional", "alt"])
+def test_point_to_point_matches_networkx(backend, algorithm):
+    destinations, fares = _synthetic_data()
+    graph = _build(destinations, fares, backend=backend, search_algorithm=algorithm, cache_size=0)
+    for has_visa in (True, False):
+        reference = _reference_graph(destinations, fares, has_visa)
+        for origin, destination in _pairs(reference.nodes()):
+            cost, stops, path = graph.find_route(origin, destination, has_visa, "costo")
+            assert cost == pytest.approx(nx.dijkstra_path_length(reference, origin, destination, weight='cost'))
+            assert sum(reference[u][v]['cost'] for u, v in zip(path, path[1:])) == pytest.approx(cost)
+            _, stops, path = graph.find_route(origin, destination, has_visa, "escalas")
+            assert stops == nx.shortest_path_length(reference, origin, destination)
+            assert all(reference.has_edge(u, v) for u, v in zip(path, path[1:]))
+
+
+@pytest.mark.parametrize("backend", ["networkx", "csr"])
+def test_k_shortest_paths_match_networkx(backend):
+    destinations, fares = _synthetic_data(num_airports=25)
+    graph = _build(destinations, fares, backend=backend, cache_size=0)
+    reference = _reference_graph(destinations, fares, True)
+    for origin, destination in _pairs(reference.nodes(), count=8):
+        expected = [nx.path_weight(reference, path, 'cost')
+                    for path in islice(nx.shortest_simple_paths(reference, origin, destination, weight='cost'), 5)]
+        routes = graph.find_k_shortest_paths_cost(origin, destination, True, k=5)
+        assert [cost for cost, _ in routes] == pytest.approx(expected)
+        assert len({tuple(path) for _, path in routes}) == len(routes)
+
+        limited = [cost for cost, path in graph.find_k_shortest_paths_cost(origin, destination, True, k=3, max_stops=3)]
+        paths = nx.shortest_simple_paths(reference, origin, destination, weight='cost')
+        expected = [nx.path_weight(reference, path, 'cost') for path in paths if len(path) - 1 <= 3][:3]
+        assert limited == pytest.approx(expected)
+
+
+def _cheapest_within_stops(reference, origin, destination, max_stops):
+    """Costo mínimo de origin a destination con a lo sumo max_stops vuelos (Bellman-Ford por capas)."""
+    best = {origin: 0.0}
+    for _ in range(max_stops):
+        layer = dict(best)
+        for node, cost in best.items():
+            for neighbor, data in reference[node].items():
+                if cost + data['cost'] < layer.get(neighbor, math.inf):
+                    layer[neighbor] = cost + data['cost']
+        best = layer
+    return best.get(destination, math.inf)
+
+
+@pytest.mark.parametrize("backend", ["networkx", "csr"])
+def test_pareto_routes_match_hop_bounded_costs(backend):
+    destinations, fares = _synthetic_data()
+    graph = _build(destinations, fares, backend=backend, cache_size=0)
+    reference = _reference_graph(destinations, fares, True)
+    for origin, destination in _pairs(reference.nodes(), count=10):
+        front = graph.find_pareto_routes(origin, destination, True)
+        fewest = nx.shortest_path_length(reference, origin, destination)
+        cheapest = nx.dijkstra_path_length(reference, origin, destination, weight='cost')
+        expected = []
+        for max_stops in range(fewest, len(reference)):
+            cost = _cheapest_within_stops(reference, origin, destination, max_stops)
+            if not expected or cost < expected[-1][0] - 1e-9:
+                expected.append((cost, max_stops))
+            if cost <= cheapest + 1e-9:
+                break
+        expected.reverse()
+        assert [(pytest.approx(cost), stops) for cost, stops, _ in front] == expected
+        for max_stops in (fewest, fewest + 1):
+            cost, stops, _ = graph.find_cheapest_route_max_stops(origin, destination, True, max_stops)
+            assert stops <= max_stops
+            assert cost == pytest.approx(_cheapest_within_stops(reference, origin, destination, max_stops))
+
+
+@pytest.mark.parametrize("backend", ["networkx", "csr"])
+def test_incremental_updates_match_a_rebuilt_graph(backend):
+    destinations, fares = _synthetic_data()
+    graph = _build(destinations, fares, backend=backend, precompute=True)
+    rng = random.Random(11)
+    codes = sorted(destinations)
+
+    def check():
+        rebuilt = _build(destinations, fares, backend=backend, cache_size=0)
+        for has_visa in (True, False):
+            for mode in ("costo", "escalas"):
+                for origin, destination in _pairs(destinations, count=15, seed=rng.random()):
+                    _assert_same_route(graph.find_route(origin, destination, has_visa, mode),
+                                       rebuilt.find_route(origin, destination, has_visa, mode), mode)
+
+    check()
+    for step in range(12):
+        (u, v), price = rng.choice(sorted(fares.items()))
+        action = step % 4
+        if action == 0:
+            fares[(u, v)] = price / 3
+            graph.set_fare(u, v, price / 3)
+        elif action == 1:
+            fares[(u, v)] = price * 4
+            graph.set_fare(u, v, price * 4)
+        elif action == 2:
+            del fares[(u, v)]
+            graph.remove_fare(u, v)
+        else:
+            a, b = rng.sample(codes, 2)
+            if (a, b) not in fares and (b, a) not in fares:
+                fares[(a, b)] = 5.0
+                graph.set_fare(a, b, 5.0)
+        check()
+
+    code = next(code for code in codes[1:] if not destinations[code]['requiere_visa'])
+    destinations[code]['requiere_visa'] = True
+    graph.set_visa_requirement(code, True)
+    check()
+
+    destinations['NEW'] = {'name': "Isla nueva", 'requiere_visa': False}
+    graph.add_destination('NEW', "Isla nueva", False)
+    fares[('NEW', codes[0])] = 1.0
+    graph.set_fare('NEW', codes[0], 1.0)
+    check()
+
+    removed = codes[2]
+    del destinations[removed]
+    fares = {pair: price for pair, price in fares.items() if removed not in pair}
+    graph.remove_destination(removed)
+    check()
+
+
+def test_new_fares_are_buffered_until_the_next_query_on_csr():
+    destinations, fares = _synthetic_data()
+    graph = _build(destinations, fares, backend="csr")
+    indptr = graph._csr.indptr
+    codes = sorted(destinations)
+    new_fares = [(u, v) for u in codes for v in codes
+                 if u < v and (u, v) not in fares and (v, u) not in fares][:30]
+    for price, (u, v) in enumerate(new_fares, start=1):
+        graph.set_fare(u, v, float(price))
+    u, v = new_fares[0]
+    graph.set_fare(u, v, 0.5)
+    assert graph._csr.indptr is indptr
+
+    rebuilt = _build(destinations, {**fares, **{pair: float(price) for price, pair in enumerate(new_fares, start=1)},
+                                    new_fares[0]: 0.5}, backend="csr")
+    for origin, destination in _pairs(destinations):
+        _assert_same_route(graph.find_route(origin, destination, True),
+                           rebuilt.find_route(origin, destination, True), "costo")
+    assert graph._csr.indptr is not indptr
+
+
+@pytest.mark.parametrize("price", [-1.0, math.nan, math.inf])
+def test_set_fare_rejects_invalid_prices(bundled_graph, price):
+    before = bundled_graph.find_route('CCS', 'SXM', True)
+    with pytest.raises(ValueError):
+        bundled_graph.set_fare('CCS', 'AUA', price)
+    assert bundled_graph.find_route('CCS', 'SXM', True) == before
+
+
+def test_route_cache_is_keyed_by_algorithm():
+    graph = TravelGraph.from_files("destinos.txt", "tarifas.txt")
+    profiler = graph.enable_profiling()
+    graph.find_route('CCS', 'SXM', True)
+    graph.find_route('CCS', 'SXM', True, algorithm="alt")
+    graph.find_route('CCS', 'SXM', True, algorithm="alt")
+    assert [record.get('cache') for record in profiler.records] == ["miss", "miss", "hit"]
+
+
+@pytest.mark.parametrize("options", [{'precompute': True}, {'search_algorithm': "alt"}])
+def test_warm_up_prepares_both_visa_states(options):
+    destinations, fares = _synthetic_data()
+    first = sorted(destinations)[0]
+    destinations[first]['requiere_visa'] = True
+    graph = _build(destinations, fares, **options)
+    graph.warm_up()
+    if options.get('precompute'):
+        assert set(graph._tables) == {True, False}
+    else:
+        assert set(graph._landmarks) == {(has_visa, mode) for has_visa in (True, False) for mode in ("costo", "escalas")}
@@ -1,164 +1,1404 @@
-import networkx as nx
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure 
+import heapq
+import math
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from itertools import count, islice
+from typing import TYPE_CHECKING
+
+import numpy as np
+from csr_graph import CSRGraph
+from data_loader import FareColumns, file_signature, load_fare_columns, read_destinations, remap_fare_columns
+from profiling import NULL_PROFILER, QueryProfiler
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+# Vista sobre la que corren las búsquedas: vecinos de un nodo interno (con y
+# sin la cantidad de escalas de cada vuelo), nodos visitables, conversión
+# código <-> nodo interno y prueba de pertenencia.
+_SearchSpace = namedtuple('_SearchSpace', ['neighbors', 'neighbors_with_stops', 'nodes', 'to_node', 'to_code', 'contains'])
+
+
+def _identity(value):
+    return value
+
+
+def _graph_neighbors(graph):
+    """Retorna una función que enumera los pares (vecino, costo) de un nodo del grafo."""
+    adjacency = graph.adj
+
+    def neighbors(node):
+        for neighbor, data in adjacency[node].items():
+            yield neighbor, data['cost']
+
+    return neighbors
+
+
+def _graph_neighbors_with_stops(graph):
+    """Como _graph_neighbors, pero enumera (vecino, costo, escalas) usando el atributo 'stops' del vuelo."""
+    adjacency = graph.adj
+
+    def neighbors(node):
+        for neighbor, data in adjacency[node].items():
+            yield neighbor, data['cost'], data.get('stops', 1)
+
+    return neighbors
+
+
+def _constrained_cheapest_path(neighbors, source, target, blocked_nodes=(), blocked_edges=(),
+                               max_cost=math.inf, max_stops=None):
+    """
+    Busca la ruta más barata de source a target evitando los nodos y aristas
+    bloqueados, sin superar max_cost ni max_stops vuelos.
+    Retorna (ruta, costos_acumulados) o None si no existe tal ruta.
+    """
+    if max_stops is None:
+        dist = {source: 0}
+        pred = {source: None}
+        settled = set()
+        heap = [(0, source)]
+        while heap:
+            d, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled.add(node)
+            if node == target:
+                path = []
+                while node is not None:
+                    path.append(node)
+                    node = pred[node]
+                path.reverse()
+                return path, [dist[n] for n in path]
+            for neighbor, cost in neighbors(node):
+                if neighbor in blocked_nodes or (node, neighbor) in blocked_edges:
+                    continue
+                nd = d + cost
+                if nd <= max_cost and nd < dist.get(neighbor, math.inf):
+                    dist[neighbor] = nd
+                    pred[neighbor] = node
+                    heapq.heappush(heap, (nd, neighbor))
+        return None
+
+    # Búsqueda por etiquetas (costo, vuelos): una etiqueta solo se expande si
+    # usa menos vuelos que todas las etiquetas ya asentadas en el mismo nodo.
+    fewest_stops = {}
+    tie = count()
+    heap = [(0, 0, next(tie), source, None)]
+    while heap:
+        d, stops, _, node, parent = heapq.heappop(heap)
+        if stops >= fewest_stops.get(node, math.inf):
+            continue
+        fewest_stops[node] = stops
+        label = (d, node, parent)
+        if node == target:
+            path, costs = [], []
+            while label is not None:
+                path.append(label[1])
+                costs.append(label[0])
+                label = label[2]
+            path.reverse()
+            costs.reverse()
+            return path, costs
+        if stops == max_stops:
+            continue
+        for neighbor, cost in neighbors(node):
+            if neighbor in blocked_nodes or (node, neighbor) in blocked_edges:
+                continue
+            nd = d + cost
+            if nd <= max_cost and stops + 1 < fewest_stops.get(neighbor, math.inf):
+                heapq.heappush(heap, (nd, stops + 1, next(tie), neighbor, label))
+    return None
+
+
+def _cheapest_route(neighbors, source, target):
+    """
+    Dijkstra que se detiene al asentar target.
+    Retorna (costo_total, escalas, ruta) o None si no hay ruta.
+    """
+    found = _constrained_cheapest_path(neighbors, source, target)
+    if found is None:
+        return None
+    path, costs = found
+    return costs[-1], len(path) - 1, path
+
+
+def _fewest_stops_route(neighbors, source, target):
+    """
+    Búsqueda en anchura que se detiene al descubrir target y acumula el costo
+    de cada tramo durante el mismo recorrido.
+    Retorna (costo_total, escalas, ruta) o None si no hay ruta.
+    """
+    pred = {source: None}
+    total = {source: 0}
+    frontier = [source]
+    while frontier:
+        if target in pred:
+            break
+        next_frontier = []
+        for node in frontier:
+            for neighbor, cost in neighbors(node):
+                if neighbor in pred:
+                    continue
+                pred[neighbor] = node
+                total[neighbor] = total[node] + cost
+                if neighbor == target:
+                    break
+                next_frontier.append(neighbor)
+            if target in pred:
+                break
+        frontier = next_frontier
+    if target not in pred:
+        return None
+    path = []
+    node = target
+    while node is not None:
+        path.append(node)
+        node = pred[node]
+    path.reverse()
+    return total[target], len(path) - 1, path
+
+
+def _insert_edge_into_tables(tables, origin, destination, price, new_edge):
+    """
+    Actualiza en el lugar las tablas de todos los pares tras agregar un vuelo
+    o bajar su precio. Para cada sentido u -> v de la arista, un par (i, j)
+    mejora si d[i, u] + peso + d[v, j] < d[i, j]; en ese caso su predecesor
+    pasa a ser el de j en la fila v (o u si j es v). La tabla de escalas solo
+    cambia si el vuelo es nuevo.
+    """
+    index = tables['index']
+    u, v = index[origin], index[destination]
+    updates = [('cost', 'cost_pred', price)]
+    if new_edge:
+        updates.append(('hops', 'hops_pred', 1))
+
+    for key, pred_key, weight in updates:
+        dist = tables[key]
+        pred = tables[pred_key]
+        if key == 'hops':
+            work = np.where(dist < 0, np.inf, dist).astype(np.float64)
+        else:
+            work = dist
+        for a, b in ((u, v), (v, u)):
+            candidate = work[:, a][:, None] + weight + work[b, :][None, :]
+            improved = candidate < work
+            if not improved.any():
+                continue
+            row = pred[b, :].copy()
+            row[b] = a
+            work[improved] = candidate[improved]
+            pred[improved] = np.broadcast_to(row, pred.shape)[improved]
+        if key == 'hops':
+            dist[:] = np.where(np.isinf(work), -1, work).astype(dist.dtype)
+
+
+def _shortest_path_tree(neighbors, source, mode="costo"):
+    """
+    Búsqueda completa desde source: Dijkstra por costo o anchura por escalas.
+    Retorna (distancias, predecesores, costos) como diccionarios indexados por
+    nodo; en la búsqueda por escalas 'costos' es el costo de la ruta hallada.
+    Los empates se resuelven igual sin importar el orden de los vecinos: por
+    costo gana la ruta con menos escalas y por escalas la más barata.
+    """
+    dist = {source: 0}
+    pred = {source: None}
+    if mode == "escalas":
+        total = {source: 0}
+        frontier = [source]
+        while frontier:
+            next_frontier = []
+            for node in frontier:
+                level = dist[node] + 1
+                for neighbor, cost in neighbors(node):
+                    if neighbor not in dist:
+                        dist[neighbor] = level
+                        total[neighbor] = total[node] + cost
+                        pred[neighbor] = node
+                        next_frontier.append(neighbor)
+                    elif dist[neighbor] == level and total[node] + cost < total[neighbor]:
+                        total[neighbor] = total[node] + cost
+                        pred[neighbor] = node
+            frontier = next_frontier
+        return dist, pred, total
+
+    hops = {source: 0}
+    settled = set()
+    heap = [(0, 0, source)]
+    while heap:
+        d, h, node = heapq.heappop(heap)
+        if node in settled:
+            continue
+        settled.add(node)
+        for neighbor, cost in neighbors(node):
+            nd = d + cost
+            known = dist.get(neighbor, math.inf)
+            if nd < known or (nd == known and h + 1 < hops[neighbor] and neighbor not in settled):
+                dist[neighbor] = nd
+                hops[neighbor] = h + 1
+                pred[neighbor] = node
+                heapq.heappush(heap, (nd, h + 1, neighbor))
+    return dist, pred, dist
+
+
+def _walk_back(pred, node):
+    """Retorna la ruta desde la raíz del árbol de predecesores hasta node."""
+    path = []
+    while node is not None:
+        path.append(node)
+        node = pred[node]
+    path.reverse()
+    return path
+
+
+def _bidirectional_cheapest_route(neighbors, source, target):
+    """
+    Dijkstra simultáneo desde source y desde target (el grafo no es
+    dirigido), expandiendo siempre el lado de menor radio. Termina cuando la
+    suma de ambos radios alcanza la mejor ruta encontrada.
+    Retorna (costo_total, escalas, ruta) o None si no hay ruta.
+    """
+    if source == target:
+        return 0, 0, [source]
+    dist = ({source: 0}, {target: 0})
+    pred = ({source: None}, {target: None})
+    settled = (set(), set())
+    heaps = ([(0, source)], [(0, target)])
+    best, meeting = math.inf, None
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        other = 1 - side
+        d, node = heapq.heappop(heaps[side])
+        if node in settled[side]:
+            continue
+        settled[side].add(node)
+        for neighbor, cost in neighbors(node):
+            nd = d + cost
+            if nd < dist[side].get(neighbor, math.inf):
+                dist[side][neighbor] = nd
+                pred[side][neighbor] = node
+                heapq.heappush(heaps[side], (nd, neighbor))
+            if neighbor in dist[other]:
+                total = dist[side][neighbor] + dist[other][neighbor]
+                if total < best:
+                    best, meeting = total, neighbor
+    if meeting is None:
+        return None
+    path = _walk_back(pred[0], meeting)
+    path.extend(reversed(_walk_back(pred[1], meeting)[:-1]))
+    return best, len(path) - 1, path
+
+
+def _bidirectional_fewest_stops_route(neighbors, source, target):
+    """
+    Búsqueda en anchura desde ambos extremos, avanzando cada vez un nivel
+    completo del lado con la frontera más pequeña.
+    Retorna (costo_total, escalas, ruta) o None si no hay ruta.
+    """
+    if source == target:
+        return 0, 0, [source]
+    pred = ({source: None}, {target: None})
+    level = ({source: 0}, {target: 0})
+    total = ({source: 0}, {target: 0})
+    frontiers = ([source], [target])
+    while frontiers[0] and frontiers[1]:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        other = 1 - side
+        best = None
+        next_frontier = []
+        for node in frontiers[side]:
+            for neighbor, cost in neighbors(node):
+                if neighbor in level[other]:
+                    hops = level[side][node] + 1 + level[other][neighbor]
+                    if best is None or hops < best[0]:
+                        best = (hops, node, neighbor, cost)
+                if neighbor not in level[side]:
+                    level[side][neighbor] = level[side][node] + 1
+                    total[side][neighbor] = total[side][node] + cost
+                    pred[side][neighbor] = node
+                    next_frontier.append(neighbor)
+        if best is not None:
+            hops, node, neighbor, cost = best
+            near = _walk_back(pred[side], node)
+            far = list(reversed(_walk_back(pred[other], neighbor)))
+            path = near + far if side == 0 else list(reversed(near + far))
+            return total[side][node] + cost + total[other][neighbor], hops, path
+        frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+    return None
+
+
+def _select_landmarks(neighbors, nodes, landmark_count, mode="costo"):
+    """
+    Elige landmark_count nodos alejados entre sí (cada uno es el más lejano
+    de los ya elegidos) y retorna sus distancias a todos los nodos.
+    """
+    nodes = list(nodes)
+    if not nodes or landmark_count <= 0:
+        return []
+    dist, _, _ = _shortest_path_tree(neighbors, nodes[0], mode)
+    candidate = max(dist, key=dist.get)
+    closest = dict.fromkeys(nodes, math.inf)
+    landmarks = []
+    while len(landmarks) < landmark_count:
+        dist, _, _ = _shortest_path_tree(neighbors, candidate, mode)
+        landmarks.append(dist)
+        for node in nodes:
+            d = dist.get(node, math.inf)
+            if d < closest[node]:
+                closest[node] = d
+        # Los nodos no alcanzados (otra componente) tienen prioridad.
+        candidate = max(nodes, key=closest.__getitem__)
+        if closest[candidate] == 0:
+            break
+    return landmarks
+
+
+def _landmark_heuristic(landmarks, target):
+    """
+    Cota inferior ALT de la distancia de un nodo a target: por la
+    desigualdad triangular, |d(L, target) - d(L, nodo)| para cada landmark L.
+    Retorna infinito si el nodo y target quedan en componentes distintas.
+    """
+    pairs = [(dist, dist.get(target)) for dist in landmarks]
+
+    def heuristic(node):
+        bound = 0
+        for dist, to_target in pairs:
+            to_node = dist.get(node)
+            if to_target is None or to_node is None:
+                if to_target is None and to_node is None:
+                    continue
+                return math.inf
+            diff = abs(to_target - to_node)
+            if diff > bound:
+                bound = diff
+        return bound
+
+    return heuristic
+
+
+def _astar_route(neighbors, source, target, heuristic, unit_weights=False):
+    """
+    A* guiado por heuristic (una cota inferior consistente). Con
+    unit_weights cada vuelo pesa 1, para buscar la ruta de menos escalas.
+    Retorna (costo_total, escalas, ruta) o None si no hay ruta.
+    """
+    g = {source: 0}
+    total = {source: 0}
+    pred = {source: None}
+    closed = set()
+    heap = [(heuristic(source), 0, source)]
+    while heap:
+        _, g_node, node = heapq.heappop(heap)
+        if node in closed:
+            continue
+        if node == target:
+            path = _walk_back(pred, node)
+            return total[node], len(path) - 1, path
+        closed.add(node)
+        for neighbor, cost in neighbors(node):
+            ng = g_node + (1 if unit_weights else cost)
+            if ng < g.get(neighbor, math.inf):
+                h = heuristic(neighbor)
+                if h == math.inf:
+                    continue
+                g[neighbor] = ng
+                total[neighbor] = total[node] + cost
+                pred[neighbor] = node
+                heapq.heappush(heap, (ng + h, ng, neighbor))
+    return None
+
+
+def _iter_pareto_routes(neighbors_with_stops, source, target, max_stops=None):
+    """
+    Búsqueda por etiquetas (costo, escalas) en un solo recorrido. Produce en
+    orden de costo creciente las rutas de source a target que no son
+    dominadas por otra más barata y con igual o menos escalas, como tuplas
+    (costo_total, escalas, ruta). Las escalas se suman con el atributo
+    'stops' de cada vuelo. La primera ruta producida con max_stops es la más
+    barata con a lo sumo max_stops escalas.
+    """
+    # Las etiquetas salen del heap por (costo, escalas), así que una etiqueta
+    # está dominada si su nodo ya asentó otra con igual o menos escalas.
+    fewest_stops = {}
+    tie = count()
+    heap = [(0, 0, next(tie), source, None)]
+    while heap:
+        d, stops, _, node, parent = heapq.heappop(heap)
+        if stops >= fewest_stops.get(node, math.inf):
+            continue
+        fewest_stops[node] = stops
+        label = (node, parent)
+        if node == target:
+            path = []
+            while label is not None:
+                path.append(label[0])
+                label = label[1]
+            path.reverse()
+            yield d, stops, path
+            continue
+        for neighbor, cost, leg_stops in neighbors_with_stops(node):
+            new_stops = stops + leg_stops
+            if max_stops is not None and new_stops > max_stops:
+                continue
+            # Una etiqueta con tantas escalas como la mejor ruta ya hallada
+            # nunca podrá mejorarla.
+            if new_stops >= fewest_stops.get(target, math.inf):
+                continue
+            if new_stops < fewest_stops.get(neighbor, math.inf):
+                heapq.heappush(heap, (d + cost, new_stops, next(tie), neighbor, label))
+
+
+def _iter_cheapest_paths(neighbors, source, target, max_cost=None, max_stops=None):
+    """
+    Generador perezoso (algoritmo de Yen) de rutas simples de source a target
+    en orden de costo creciente. Produce tuplas (costo_total, ruta) y solo
+    calcula la siguiente ruta cuando se solicita. Los costos acumulados de
+    cada ruta se guardan para no volver a sumar los tramos compartidos.
+    """
+    max_cost = math.inf if max_cost is None else max_cost
+    first = _constrained_cheapest_path(neighbors, source, target, max_cost=max_cost, max_stops=max_stops)
+    if first is None:
+        return
+
+    tie = count()
+    candidates = [(first[1][-1], next(tie), first[0], first[1])]
+    seen = {tuple(first[0])}
+    accepted = []
+    while candidates:
+        total, _, path, costs = heapq.heappop(candidates)
+        yield total, path
+        accepted.append(path)
+
+        for i in range(len(path) - 1):
+            root = path[:i + 1]
+            root_cost = costs[i]
+            blocked_edges = {
+                (other[i], other[i + 1]) for other in accepted
+                if len(other) > i + 1 and other[:i + 1] == root
+            }
+            spur = _constrained_cheapest_path(
+                neighbors, path[i], target,
+                blocked_nodes=set(root[:-1]),
+                blocked_edges=blocked_edges,
+                max_cost=max_cost - root_cost,
+                max_stops=None if max_stops is None else max_stops - i,
+            )
+            if spur is None:
+                continue
+            spur_path, spur_costs = spur
+            candidate = root[:-1] + spur_path
+            key = tuple(candidate)
+            if key in seen:
+                continue
+            seen.add(key)
+            candidate_costs = costs[:i] + [root_cost + c for c in spur_costs]
+            heapq.heappush(candidates, (candidate_costs[-1], next(tie), candidate, candidate_costs))
+
+
+class RouteCache:
+    """
+    Caché LRU acotada de resultados de consultas de rutas.
+    Cada entrada guarda la versión del grafo con la que se calculó; una
+    entrada de una versión anterior cuenta como fallo y se descarta.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """Retorna el resultado guardado para key, o None si no existe o está desactualizado."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, result):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (version, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Retorna los contadores de aciertos y fallos y la ocupación actual."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+
+def _copy_route(result):
+    """Copia la ruta de un resultado para que quien llama no altere la caché."""
+    cost, stops, path = result
+    return cost, stops, list(path) if isinstance(path, list) else path
+
+
+def _copy_routes(results):
+    return [(cost, list(path) if isinstance(path, list) else path) for cost, path in results]
+
+
+# Matriz de tarifas entre orígenes (filas) y destinos (columnas): costs usa
+# infinito y stops -1 cuando no hay ruta; los índices traducen código -> fila
+# o columna.
+FareMatrix = namedtuple('FareMatrix', ['costs', 'stops', 'origins', 'destinations', 'origin_index', 'destination_index'])
+
+
+def _tree_depths(pred):
+    """Cantidad de vuelos de cada nodo del árbol de predecesores hasta la raíz."""
+    depth = {}
+    for node in pred:
+        chain = []
+        while node is not None and node not in depth:
+            chain.append(node)
+            node = pred[node]
+        base = -1 if node is None else depth[node]
+        for item in reversed(chain):
+            base += 1
+            depth[item] = base
+    return depth
+
+
+def _fare_rows(graph, origins, destinations, has_visa, mode):
+    """
+    Calcula las filas de costos y escalas de una matriz de tarifas con una
+    búsqueda completa por origen. Retorna (costos, escalas) como arreglos.
+    """
+    space = graph._search_space(has_visa)
+    targets = [space.to_node(code) if space.contains(code) else None for code in destinations]
+    costs = np.full((len(origins), len(destinations)), np.inf, dtype=np.float64)
+    stops = np.full((len(origins), len(destinations)), -1, dtype=np.int32)
+    for row, origin in enumerate(origins):
+        if not space.contains(origin):
+            continue
+        with graph.profiler.stage("busqueda"):
+            dist, pred, total_cost = _shortest_path_tree(space.neighbors, space.to_node(origin), mode)
+        hops = _tree_depths(pred) if mode == "costo" else dist
+        reached = [(column, node) for column, node in enumerate(targets) if node is not None and node in dist]
+        if reached:
+            columns = [column for column, _ in reached]
+            costs[row, columns] = [total_cost[node] for _, node in reached]
+            stops[row, columns] = [hops[node] for _, node in reached]
+    return costs, stops
+
+
+_matrix_worker_graph = None
+
+
+def _init_matrix_worker(destinations_data, fare_columns, backend):
+    global _matrix_worker_graph
+    _matrix_worker_graph = TravelGraph(destinations_data, fare_columns, backend=backend, cache_size=0)
+
+
+def _matrix_worker_rows(origins, destinations, has_visa, mode):
+    return _fare_rows(_matrix_worker_graph, origins, destinations, has_visa, mode)
+
+
+class ShortestPathTree:
+    """
+    Rutas desde un origen hacia todos los destinos alcanzables, obtenidas con
+    una sola búsqueda. route(destino) reconstruye cada ruta bajo demanda.
+    """
+
+    def __init__(self, origin, mode, space, dist, pred, total_cost):
+        self.origin = origin
+        self.mode = mode
+        self._space = space
+        self._dist = dist
+        self._pred = pred
+        self._total_cost = total_cost
+
+    def route(self, destination: str):
+        """Retorna (costo_total, escalas, ruta), o (None, None, mensaje) si no hay ruta."""
+        space = self._space
+        if not space.contains(destination):
+            return None, None, "Origen o destino no accesible sin visa o no existe."
+        node = space.to_node(destination)
+        if node not in self._dist:
+            return None, None, f"No se encontró una ruta por {self.mode} entre los destinos seleccionados."
+        path = []
+        while node is not None:
+            path.append(space.to_code(node))
+            node = self._pred[node]
+        path.reverse()
+        return self._total_cost[space.to_node(destination)], len(path) - 1, path
+
 
 class TravelGraph:
-    def __init__(self, destinations_data, fares_data):
+    def __init__(self, destinations_data, fares_data, precompute=False, backend="networkx", cache_size=256,
+                 search_algorithm="dijkstra", landmark_count=8, profiler=None):
+        """
+        fares_data puede ser la lista de read_fares o un FareColumns de
+        load_fare_columns. Si precompute es True, las consultas de costo
+        mínimo y menos escalas se responden con tablas de todos los pares
+        calculadas una sola vez.
+        backend elige dónde corren las búsquedas: "networkx" o "csr"
+        (arreglos NumPy compactos, ver csr_graph.CSRGraph).
+        cache_size es la cantidad máxima de consultas recientes que se
+        guardan en la caché LRU de rutas (0 la desactiva).
+        search_algorithm es el algoritmo por defecto de las consultas punto a
+        punto: "dijkstra", "bidirectional" o "alt" (A* con landmark_count
+        landmarks como cotas inferiores).
+        profiler es un profiling.QueryProfiler opcional que registra tiempos
+        por etapa, nodos explorados y aciertos de caché de cada consulta (ver
+        enable_profiling).
+        """
+        if backend not in ("networkx", "csr"):
+            raise ValueError(f"Backend desconocido: {backend}")
+        if search_algorithm not in ("dijkstra", "bidirectional", "alt"):
+            raise ValueError(f"Algoritmo de búsqueda desconocido: {search_algorithm}")
+        self.search_algorithm = search_algorithm
+        self.landmark_count = landmark_count
+        self._landmarks = {}
         self.destinations = destinations_data
         self.fares = fares_data
-        self.graph = nx.Graph() 
+        self.precompute = precompute
+        self.backend = backend
+        self._graph = None
+        self._csr = None
+        self._no_visa_graph = None
+        self._tables = {}
+        self._layouts = {}
+        self._source_files = None
+        self._source_signature = None
+        # Aumenta con cada cambio de destinos o tarifas.
+        self.version = 0
+        self.route_cache = RouteCache(cache_size)
+        self.profiler = profiler or NULL_PROFILER
+        with self.profiler.operation("build_graph", backend=backend):
+            with self.profiler.stage("construccion"):
+                self._build_graph()
+
+    @classmethod
+    def from_files(cls, destinations_path="destinos.txt", fares_path="tarifas.txt", precompute=False,
+                   backend="networkx", cache_size=256, search_algorithm="dijkstra", profiler=None):
+        """
+        Crea el grafo leyendo los archivos de destinos y tarifas y recuerda
+        su firma para poder recargarlos solo cuando cambien. Las tarifas se
+        leen con load_fare_columns, que reutiliza su caché binario.
+        """
+        tracker = profiler or NULL_PROFILER
+        with tracker.operation("from_files", backend=backend):
+            with tracker.stage("lectura_destinos"):
+                destinations_data = read_destinations(destinations_path, profiler=profiler)
+            with tracker.stage("lectura_tarifas"):
+                fares_data = load_fare_columns(fares_path, profiler=profiler)
+            instance = cls(destinations_data, fares_data, precompute=precompute, backend=backend,
+                           cache_size=cache_size, search_algorithm=search_algorithm, profiler=profiler)
+        instance._source_files = (destinations_path, fares_path)
+        instance._source_signature = tuple(file_signature(path) for path in instance._source_files)
+        return instance
 
+    @property
+    def graph(self):
+        """
+        Grafo completo de networkx. Con el backend "csr" se construye solo
+        cuando se necesita (por ejemplo, para dibujar).
+        """
+        if self._graph is None:
+            self._graph = self._csr.to_networkx()
+        return self._graph
+
+    def _build_graph(self):
+        """Construye el grafo completo a partir de los destinos y tarifas actuales."""
+        if not self.destinations:
+            print("No se pudieron cargar los datos de destinos. El grafo no se inicializará correctamente.")
+        if self.fares is None or len(self.fares.prices if isinstance(self.fares, FareColumns) else self.fares) == 0:
+            print("No se pudieron cargar los datos de tarifas.")
+
+        if self.backend == "csr":
+            self._csr = CSRGraph.from_data(self.destinations, self.fares)
+            self._graph = None
+            return
+
+        # networkx solo se importa si se usa su backend (o para dibujar).
+        import networkx as nx
+
+        graph = nx.Graph() 
         if self.destinations:
             for code, data in self.destinations.items():
-                self.graph.add_node(code, name=data['name'], requiere_visa=data['requiere_visa'])
-        else:
-            print("No se pudieron cargar los datos de destinos. El grafo no se inicializará correctamente.")
-            
-        if self.fares:
+                graph.add_node(code, name=data['name'], requiere_visa=data['requiere_visa'])
+
+        if isinstance(self.fares, FareColumns):
+            codes = list(graph.nodes())
+            origins, destinations, prices = remap_fare_columns(self.fares, {code: i for i, code in enumerate(codes)})
+            graph.add_edges_from(
+                (codes[origin], codes[destination], {'cost': price, 'stops': 1})
+                for origin, destination, price in zip(origins.tolist(), destinations.tolist(), prices.tolist())
+            )
+        elif self.fares:
             for fare in self.fares:
                 origin = fare['origin']
                 destination = fare['destination']
                 price = fare['price']
-                if self.graph.has_node(origin) and self.graph.has_node(destination):
-                    self.graph.add_edge(origin, destination, cost=price, stops=1)
+                if graph.has_node(origin) and graph.has_node(destination):
+                    graph.add_edge(origin, destination, cost=price, stops=1)
                 else:
                     print(f"Advertencia: Vuelo de {origin} a {destination} no añadido, uno o ambos aeropuertos no existen en la lista de destinos.")
-        else:
-            print("No se pudieron cargar los datos de tarifas.")
+        self._graph = graph
+
+    def _invalidate_caches(self):
+        """Descarta las vistas derivadas del grafo; se reconstruyen en la siguiente consulta."""
+        self._no_visa_graph = None
+        self._tables = {}
+        self._layouts = {}
+        self._landmarks = {}
+
+    def reload(self, destinations_data, fares_data):
+        """
+        Reemplaza los destinos y tarifas, reconstruye el grafo e invalida
+        las vistas en caché.
+        """
+        self.destinations = destinations_data
+        self.fares = fares_data
+        with self.profiler.operation("reload", backend=self.backend):
+            with self.profiler.stage("construccion"):
+                self._build_graph()
+        self._invalidate_caches()
+        self.version += 1
 
     def get_filtered_graph(self, has_visa: bool):
+        """
+        Retorna el grafo accesible según el estado de la visa.
+        El grafo sin destinos que requieren visa se materializa una sola vez
+        y se reutiliza hasta que cambien los destinos o las tarifas.
+        """
         if has_visa:
             return self.graph
-        else:
+        if self._no_visa_graph is None:
             nodes_without_visa_restriction = [
                 node for node, data in self.graph.nodes(data=True)
                 if not data.get('requiere_visa', False)
             ]
-            filtered_g = self.graph.subgraph(nodes_without_visa_restriction)
-            return filtered_g
+            self._no_visa_graph = self.graph.subgraph(nodes_without_visa_restriction).copy()
+        return self._no_visa_graph
 
-    def find_shortest_path_cost(self, origin: str, destination: str, has_visa: bool):
+    def _search_space(self, has_visa: bool):
+        """
+        Retorna la vista de búsqueda del backend activo para el estado de visa
+        dado. Con el profiler activo, sus funciones de vecinos cuentan los
+        nodos y aristas que recorre la búsqueda.
+        """
+        with self.profiler.stage("filtrado"):
+            return self._build_search_space(has_visa)
+
+    def _build_search_space(self, has_visa: bool):
+        count_neighbors = self.profiler.count_neighbors
+        if self.backend == "csr":
+            csr = self._csr
+            neighbors = count_neighbors(csr.neighbors_function(has_visa))
+            return _SearchSpace(
+                neighbors=neighbors,
+                # El CSR solo guarda vuelos directos: cada tramo cuenta una escala.
+                neighbors_with_stops=lambda node: ((neighbor, cost, 1) for neighbor, cost in neighbors(node)),
+                nodes=csr.accessible_nodes(has_visa),
+                to_node=csr.index.__getitem__,
+                to_code=csr.codes.__getitem__,
+                contains=lambda code: csr.is_accessible(code, has_visa),
+            )
         current_graph = self.get_filtered_graph(has_visa)
-        
-        if origin not in current_graph or destination not in current_graph:
-            return None, "Origen o destino no accesible sin visa o no existe."
+        return _SearchSpace(
+            neighbors=count_neighbors(_graph_neighbors(current_graph)),
+            neighbors_with_stops=count_neighbors(_graph_neighbors_with_stops(current_graph)),
+            nodes=current_graph.nodes(),
+            to_node=_identity,
+            to_code=_identity,
+            contains=current_graph.__contains__,
+        )
 
+    def _all_codes(self):
+        """Códigos de todos los aeropuertos, en el orden interno del backend."""
+        if self.backend == "csr":
+            return self._csr.active_codes()
+        return list(self.graph.nodes())
+
+    def _edge_cost(self, origin: str, destination: str):
+        """Costo del vuelo directo entre dos aeropuertos."""
+        if self.backend == "csr":
+            return self._csr.edge_cost(self._csr.index[origin], self._csr.index[destination])
+        return self.graph[origin][destination]['cost']
+
+    def _check_airport(self, code: str):
+        if code not in self.destinations:
+            raise ValueError(f"El aeropuerto '{code}' no existe en la lista de destinos.")
+
+    def _check_price(self, price: float):
+        if not math.isfinite(price) or price < 0:
+            raise ValueError(f"El precio {price} no es válido; debe ser un número finito no negativo.")
+
+    def _requires_visa(self, code: str):
+        return self.destinations[code]['requiere_visa']
+
+    def _current_fare(self, origin: str, destination: str):
+        if self.backend == "csr":
+            return self._csr.edge_cost(self._csr.index[origin], self._csr.index[destination])
+        data = self.graph.get_edge_data(origin, destination)
+        return None if data is None else data['cost']
+
+    def _changed(self):
+        """Registra un cambio en los datos del grafo."""
+        self.version += 1
+        if self.backend == "csr":
+            # El grafo de networkx y su vista sin visa se derivan del CSR.
+            self._graph = None
+            self._no_visa_graph = None
+
+    def set_fare(self, origin: str, destination: str, price: float):
+        """
+        Agrega un vuelo o cambia su precio sin reconstruir el grafo.
+        Si el precio baja o el vuelo es nuevo, las tablas precalculadas se
+        actualizan en el lugar; si sube, se descartan las tablas afectadas.
+        """
+        self._check_airport(origin)
+        self._check_airport(destination)
+        self._check_price(price)
+
+        if self.backend == "csr":
+            previous = self._csr.set_edge(self._csr.index[origin], self._csr.index[destination], price)
+        else:
+            previous = self._current_fare(origin, destination)
+            self.graph.add_edge(origin, destination, cost=price, stops=1)
+            if self._no_visa_graph is not None and origin in self._no_visa_graph and destination in self._no_visa_graph:
+                self._no_visa_graph.add_edge(origin, destination, cost=price, stops=1)
+
+        visa_free_fare = not self._requires_visa(origin) and not self._requires_visa(destination)
+        for has_visa in list(self._tables):
+            if not has_visa and not visa_free_fare:
+                continue
+            if previous is None or price < previous:
+                _insert_edge_into_tables(self._tables[has_visa], origin, destination, price, previous is None)
+            elif price != previous:
+                del self._tables[has_visa]
+        if previous is None:
+            self._layouts = {}
+        self._changed()
+
+    def remove_fare(self, origin: str, destination: str):
+        """Elimina un vuelo y descarta solo las tablas precalculadas que podían usarlo."""
+        self._check_airport(origin)
+        self._check_airport(destination)
+        if self._current_fare(origin, destination) is None:
+            raise ValueError(f"No existe un vuelo entre {origin} y {destination}.")
+
+        if self.backend == "csr":
+            self._csr.remove_edge(self._csr.index[origin], self._csr.index[destination])
+        else:
+            self.graph.remove_edge(origin, destination)
+            if self._no_visa_graph is not None and self._no_visa_graph.has_edge(origin, destination):
+                self._no_visa_graph.remove_edge(origin, destination)
+
+        self._tables.pop(True, None)
+        if not self._requires_visa(origin) and not self._requires_visa(destination):
+            self._tables.pop(False, None)
+        self._layouts = {}
+        self._changed()
+
+    def add_destination(self, code: str, name: str, requires_visa: bool = False):
+        """Agrega un aeropuerto sin vuelos; los vuelos se agregan luego con set_fare."""
+        if code in self.destinations:
+            raise ValueError(f"El aeropuerto '{code}' ya existe en la lista de destinos.")
+        self.destinations[code] = {'name': name, 'requiere_visa': requires_visa}
+
+        if self.backend == "csr":
+            self._csr.add_node(code, name, requires_visa)
+        else:
+            self.graph.add_node(code, name=name, requiere_visa=requires_visa)
+            if self._no_visa_graph is not None and not requires_visa:
+                self._no_visa_graph.add_node(code, name=name, requiere_visa=requires_visa)
+
+        # Las tablas cambian de tamaño; se recalculan en la siguiente consulta.
+        self._tables = {}
+        self._layouts = {}
+        self._changed()
+
+    def remove_destination(self, code: str):
+        """Elimina un aeropuerto junto con todos sus vuelos."""
+        self._check_airport(code)
+        del self.destinations[code]
+
+        if self.backend == "csr":
+            self._csr.remove_node(self._csr.index[code])
+        else:
+            self.graph.remove_node(code)
+            if self._no_visa_graph is not None and code in self._no_visa_graph:
+                self._no_visa_graph.remove_node(code)
+
+        self._tables = {}
+        self._layouts = {}
+        self._changed()
+
+    def set_visa_requirement(self, code: str, requires_visa: bool):
+        """
+        Cambia si un aeropuerto requiere visa. Solo se ven afectados el grafo
+        sin visa y sus tablas; las del grafo completo se conservan.
+        """
+        self._check_airport(code)
+        if self._requires_visa(code) == requires_visa:
+            return
+        self.destinations[code]['requiere_visa'] = requires_visa
+
+        if self.backend == "csr":
+            self._csr.set_requires_visa(self._csr.index[code], requires_visa)
+        else:
+            self.graph.nodes[code]['requiere_visa'] = requires_visa
+            no_visa_graph = self._no_visa_graph
+            if no_visa_graph is not None:
+                if requires_visa:
+                    no_visa_graph.remove_node(code)
+                else:
+                    no_visa_graph.add_node(code, **self.graph.nodes[code])
+                    no_visa_graph.add_edges_from(
+                        (code, neighbor, data) for neighbor, data in self.graph.adj[code].items()
+                        if neighbor in no_visa_graph
+                    )
+
+        self._tables.pop(False, None)
+        self._layouts.pop(False, None)
+        self._changed()
+
+    def reload_if_changed(self):
+        """
+        Recarga destinos y tarifas si los archivos de origen cambiaron desde
+        la última lectura. Retorna True si hubo recarga.
+        """
+        if self._source_files is None:
+            return False
+        signature = tuple(file_signature(path) for path in self._source_files)
+        if signature == self._source_signature:
+            return False
+        destinations_path, fares_path = self._source_files
+        with self.profiler.operation("reload", backend=self.backend):
+            with self.profiler.stage("lectura_destinos"):
+                destinations_data = read_destinations(destinations_path, profiler=self.profiler)
+            with self.profiler.stage("lectura_tarifas"):
+                fares_data = load_fare_columns(fares_path, profiler=self.profiler)
+            if destinations_data is None or fares_data is None:
+                return False
+            self.reload(destinations_data, fares_data)
+        self._source_signature = signature
+        return True
+
+    def _get_tables(self, has_visa: bool):
+        """
+        Retorna las tablas de todos los pares para el estado de visa dado,
+        calculándolas si aún no existen.
+        """
+        if has_visa not in self._tables:
+            self._tables[has_visa] = self._build_tables(has_visa)
+        return self._tables[has_visa]
+
+    def _build_tables(self, has_visa: bool):
+        """
+        Calcula las matrices de costo mínimo y de menos escalas entre todos
+        los pares de aeropuertos, junto con las matrices de predecesores para
+        reconstruir las rutas. Las filas y columnas siguen el orden de 'codes'.
+        Un costo infinito o una cantidad de escalas -1 indica que no hay ruta.
+        """
+        space = self._search_space(has_visa)
+        codes = self._all_codes()
+        index = {code: i for i, code in enumerate(codes)}
+        n = len(codes)
+
+        cost = np.full((n, n), np.inf, dtype=np.float64)
+        cost_pred = np.full((n, n), -1, dtype=np.int32)
+        hops = np.full((n, n), -1, dtype=np.int16)
+        hops_pred = np.full((n, n), -1, dtype=np.int32)
+
+        for source in space.nodes:
+            i = index[space.to_code(source)]
+            dists, preds, _ = _shortest_path_tree(space.neighbors, source, "costo")
+            for node, dist in dists.items():
+                j = index[space.to_code(node)]
+                cost[i, j] = dist
+                if preds[node] is not None:
+                    cost_pred[i, j] = index[space.to_code(preds[node])]
+
+            levels, preds, _ = _shortest_path_tree(space.neighbors, source, "escalas")
+            for node, level in levels.items():
+                j = index[space.to_code(node)]
+                hops[i, j] = level
+                if preds[node] is not None:
+                    hops_pred[i, j] = index[space.to_code(preds[node])]
+
+        return {
+            'codes': codes,
+            'index': index,
+            'cost': cost,
+            'cost_pred': cost_pred,
+            'hops': hops,
+            'hops_pred': hops_pred,
+        }
+
+    @staticmethod
+    def _path_from_predecessors(tables, pred_key, i, j):
+        """Reconstruye la ruta de i a j siguiendo la matriz de predecesores."""
+        pred = tables[pred_key]
+        codes = tables['codes']
+        path = [codes[j]]
+        while j != i:
+            j = pred[i, j]
+            path.append(codes[j])
+        path.reverse()
+        return path
+
+    def _lookup_route(self, has_visa: bool, mode: str, origin: str, destination: str):
+        """Obtiene (costo_total, escalas, ruta) de las tablas precalculadas, o None si no hay ruta."""
+        with self.profiler.stage("tablas"):
+            tables = self._get_tables(has_visa)
+        i, j = tables['index'][origin], tables['index'][destination]
+        with self.profiler.stage("ruta"):
+            if mode == "costo":
+                if np.isinf(tables['cost'][i, j]):
+                    return None
+                path = self._path_from_predecessors(tables, 'cost_pred', i, j)
+                return float(tables['cost'][i, j]), len(path) - 1, path
+            if tables['hops'][i, j] < 0:
+                return None
+            path = self._path_from_predecessors(tables, 'hops_pred', i, j)
+        with self.profiler.stage("suma_costos"):
+            total_cost = sum(self._edge_cost(path[k], path[k + 1]) for k in range(len(path) - 1))
+        return total_cost, int(tables['hops'][i, j]), path
+
+    def find_route(self, origin: str, destination: str, has_visa: bool, mode: str = "costo", algorithm=None):
+        """
+        Busca la mejor ruta según el modo ('costo' para la más barata o
+        'escalas' para la de menos escalas) con un único recorrido del grafo.
+        algorithm elige "dijkstra", "bidirectional" o "alt"; por defecto se
+        usa el del grafo. Con tablas precalculadas no se busca.
+        Retorna (costo_total, escalas, ruta), o (None, None, mensaje) si no
+        hay ruta.
+        """
+        if mode not in ("costo", "escalas"):
+            raise ValueError(f"Modo de búsqueda desconocido: {mode}")
+        algorithm = algorithm or self.search_algorithm
+        if algorithm not in ("dijkstra", "bidirectional", "alt"):
+            raise ValueError(f"Algoritmo de búsqueda desconocido: {algorithm}")
+        key = (origin, destination, has_visa, mode, 1, algorithm)
+        with self.profiler.operation("find_route", origin=origin, destination=destination, has_visa=has_visa,
+                                     mode=mode, algorithm=algorithm):
+            result = self.route_cache.get(key, self.version)
+            if result is None:
+                self.profiler.note(cache="miss")
+                result = self._compute_route(origin, destination, has_visa, mode, algorithm)
+                self.route_cache.put(key, self.version, result)
+            else:
+                self.profiler.note(cache="hit")
+            return _copy_route(result)
+
+    def warm_up(self):
+        """
+        Prepara para ambos estados de visa lo que las consultas usarían la
+        primera vez: la vista filtrada, las tablas de todos los pares (si se
+        precalculan) y los landmarks de ALT (si es el algoritmo por defecto).
+        """
+        for has_visa in (True, False):
+            self._search_space(has_visa)
+            if self.precompute:
+                self._get_tables(has_visa)
+            elif self.search_algorithm == "alt":
+                for mode in ("costo", "escalas"):
+                    self._get_landmarks(has_visa, mode)
+
+    def _get_landmarks(self, has_visa: bool, mode: str):
+        """Distancias desde los landmarks para ALT; se recalculan si el grafo cambió."""
+        cached = self._landmarks.get((has_visa, mode))
+        if cached is None or cached[0] != self.version:
+            space = self._search_space(has_visa)
+            with self.profiler.stage("landmarks"):
+                cached = (self.version, _select_landmarks(space.neighbors, space.nodes, self.landmark_count, mode))
+            self._landmarks[(has_visa, mode)] = cached
+        return cached[1]
+
+    def _compute_route(self, origin: str, destination: str, has_visa: bool, mode: str, algorithm="dijkstra"):
+        space = self._search_space(has_visa)
+
+        if not space.contains(origin) or not space.contains(destination):
+            return None, None, "Origen o destino no accesible sin visa o no existe."
+
+        profiler = self.profiler
         try:
-            path = nx.dijkstra_path(current_graph, source=origin, target=destination, weight='cost')
-            cost = nx.dijkstra_path_length(current_graph, source=origin, target=destination, weight='cost')
-            return cost, path
-        except nx.NetworkXNoPath:
-            return None, "No se encontró una ruta por costo entre los destinos seleccionados."
+            if self.precompute:
+                route = self._lookup_route(has_visa, mode, origin, destination)
+            else:
+                source, target = space.to_node(origin), space.to_node(destination)
+                if algorithm == "alt":
+                    heuristic = _landmark_heuristic(self._get_landmarks(has_visa, mode), target)
+                    with profiler.stage("busqueda"):
+                        route = _astar_route(space.neighbors, source, target, heuristic,
+                                             unit_weights=(mode == "escalas"))
+                else:
+                    if algorithm == "bidirectional":
+                        search = _bidirectional_cheapest_route if mode == "costo" else _bidirectional_fewest_stops_route
+                    else:
+                        search = _cheapest_route if mode == "costo" else _fewest_stops_route
+                    with profiler.stage("busqueda"):
+                        route = search(space.neighbors, source, target)
+                if route is not None:
+                    with profiler.stage("ruta"):
+                        total_cost, stops, path = route
+                        route = total_cost, stops, [space.to_code(node) for node in path]
         except Exception as e:
-            return None, f"Error al calcular la ruta por costo: {e}"
-
-    def find_shortest_path_stops(self, origin: str, destination: str, has_visa: bool):
-        current_graph = self.get_filtered_graph(has_visa)
-        
-        if origin not in current_graph or destination not in current_graph:
-            return None, "Origen o destino no accesible sin visa o no existe."
+            return None, None, f"Error al calcular la ruta por {mode}: {e}"
+        if route is None:
+            return None, None, f"No se encontró una ruta por {mode} entre los destinos seleccionados."
+        return route
 
+    def _compute_pareto_routes(self, origin: str, destination: str, has_visa: bool, max_stops, limit=None):
+        space = self._search_space(has_visa)
+        if not space.contains(origin) or not space.contains(destination):
+            return [(None, None, "Origen o destino no accesible sin visa o no existe.")]
         try:
-            path = nx.shortest_path(current_graph, source=origin, target=destination)
-            stops = len(path) - 1
-            return stops, path
-        except nx.NetworkXNoPath:
-            return None, "No se encontró una ruta por escalas entre los destinos seleccionados."
+            routes = _iter_pareto_routes(space.neighbors_with_stops, space.to_node(origin),
+                                         space.to_node(destination), max_stops=max_stops)
+            with self.profiler.stage("busqueda"):
+                results = [(cost, stops, [space.to_code(node) for node in path])
+                           for cost, stops, path in islice(routes, limit)]
         except Exception as e:
-            return None, f"Error al calcular la ruta por escalas: {e}"
+            return [(None, None, f"Error al calcular la ruta por costo: {e}")]
+        if not results:
+            return [(None, None, "No se encontró una ruta por costo entre los destinos seleccionados.")]
+        return results
+
+    def _cached_routes(self, key, compute, *args, **kwargs):
+        """Resultado de compute(*args) desde la caché de rutas, calculándolo si falta."""
+        results = self.route_cache.get(key, self.version)
+        if results is None:
+            self.profiler.note(cache="miss")
+            results = compute(*args, **kwargs)
+            self.route_cache.put(key, self.version, results)
+        else:
+            self.profiler.note(cache="hit")
+        return results
+
+    def find_cheapest_route_max_stops(self, origin: str, destination: str, has_visa: bool, max_stops: int):
+        """
+        Busca la ruta más barata con a lo sumo max_stops escalas.
+        Retorna (costo_total, escalas, ruta), o (None, None, mensaje) si no hay ruta.
+        """
+        key = (origin, destination, has_visa, "max_escalas", 1, None, max_stops)
+        with self.profiler.operation("find_cheapest_route_max_stops", origin=origin, destination=destination,
+                                     has_visa=has_visa, max_stops=max_stops):
+            results = self._cached_routes(key, self._compute_pareto_routes,
+                                          origin, destination, has_visa, max_stops, limit=1)
+            return _copy_route(results[0])
+
+    def find_pareto_routes(self, origin: str, destination: str, has_visa: bool, max_stops=None):
+        """
+        Retorna todas las rutas no dominadas en (costo, escalas) como lista de
+        tuplas (costo_total, escalas, ruta) ordenadas de la más barata a la de
+        menos escalas, obtenidas en un único recorrido del grafo. Si no hay
+        ruta, retorna [(None, None, mensaje)].
+        """
+        key = (origin, destination, has_visa, "pareto", None, None, max_stops)
+        with self.profiler.operation("find_pareto_routes", origin=origin, destination=destination,
+                                     has_visa=has_visa, max_stops=max_stops):
+            results = self._cached_routes(key, self._compute_pareto_routes,
+                                          origin, destination, has_visa, max_stops)
+            return [_copy_route(result) for result in results]
+
+    def find_routes_from(self, origin: str, has_visa: bool, mode: str = "costo"):
+        """
+        Ejecuta una única búsqueda desde origin hacia todos los destinos.
+        Retorna un ShortestPathTree, o None si el origen no es accesible.
+        """
+        if mode not in ("costo", "escalas"):
+            raise ValueError(f"Modo de búsqueda desconocido: {mode}")
+        with self.profiler.operation("find_routes_from", origin=origin, has_visa=has_visa, mode=mode):
+            space = self._search_space(has_visa)
+            if not space.contains(origin):
+                return None
+            with self.profiler.stage("busqueda"):
+                dist, pred, total_cost = _shortest_path_tree(space.neighbors, space.to_node(origin), mode)
+            return ShortestPathTree(origin, mode, space, dist, pred, total_cost)
+
+    def _fare_columns_snapshot(self):
+        """Vuelos actuales como FareColumns, para enviar el grafo a otros procesos."""
+        if self.backend == "csr":
+            origins, destinations, costs = self._csr.edge_arrays()
+            return FareColumns(list(self._csr.codes), origins.copy(), destinations.copy(), costs.copy())
+        codes = list(self.graph.nodes())
+        index = {code: i for i, code in enumerate(codes)}
+        edges = list(self.graph.edges(data='cost'))
+        return FareColumns(
+            codes,
+            np.array([index[u] for u, _, _ in edges], dtype=np.int32),
+            np.array([index[v] for _, v, _ in edges], dtype=np.int32),
+            np.array([cost for _, _, cost in edges], dtype=np.float64),
+        )
+
+    def fare_matrix(self, origins=None, destinations=None, has_visa: bool = False, mode: str = "costo",
+                    workers: int = 1):
+        """
+        Calcula la matriz de costos y escalas de las mejores rutas entre cada
+        origen y cada destino (por defecto, todos los aeropuertos), con una
+        sola búsqueda por origen. Con workers > 1 los orígenes se reparten
+        entre procesos (None usa un proceso por núcleo); el resultado no
+        depende de la cantidad de procesos. Por costo, las escalas son las de
+        la ruta más barata con menos escalas; por escalas, el costo es el de
+        la ruta más barata entre las de menos escalas.
+        Retorna un FareMatrix.
+        """
+        if mode not in ("costo", "escalas"):
+            raise ValueError(f"Modo de búsqueda desconocido: {mode}")
+        all_codes = self._all_codes()
+        origins = list(all_codes if origins is None else origins)
+        destinations = list(all_codes if destinations is None else destinations)
+        workers = workers or os.cpu_count() or 1
+
+        with self.profiler.operation("fare_matrix", origins=len(origins), destinations=len(destinations),
+                                     has_visa=has_visa, mode=mode, workers=workers):
+            if workers == 1 or len(origins) < 2:
+                costs, stops = _fare_rows(self, origins, destinations, has_visa, mode)
+            else:
+                chunk_size = max(1, -(-len(origins) // (workers * 4)))
+                chunks = [origins[i:i + chunk_size] for i in range(0, len(origins), chunk_size)]
+                from concurrent.futures import ProcessPoolExecutor
 
-    def draw_graph_with_path(self, origin_node, destination_node, path_nodes=None, has_visa=True) -> Figure:
+                snapshot = (dict(self.destinations or {}), self._fare_columns_snapshot(), self.backend)
+                # Los procesos no informan nodos explorados; solo se mide el tiempo total.
+                with self.profiler.stage("procesos"), ProcessPoolExecutor(
+                        max_workers=workers, initializer=_init_matrix_worker, initargs=snapshot) as executor:
+                    parts = list(executor.map(_matrix_worker_rows, chunks, [destinations] * len(chunks),
+                                              [has_visa] * len(chunks), [mode] * len(chunks)))
+                costs = np.vstack([part[0] for part in parts])
+                stops = np.vstack([part[1] for part in parts])
+
+        return FareMatrix(
+            costs, stops, origins, destinations,
+            {code: i for i, code in enumerate(origins)},
+            {code: j for j, code in enumerate(destinations)},
+        )
+
+    def fares_from(self, origin: str, destinations=None, has_visa: bool = False, mode: str = "costo"):
+        """
+        Tarifas desde un origen hacia todos los destinos (o los indicados),
+        como un FareMatrix de una sola fila.
+        """
+        return self.fare_matrix([origin], destinations, has_visa, mode)
+
+    def find_shortest_path_cost(self, origin: str, destination: str, has_visa: bool):
+        cost, _, path = self.find_route(origin, destination, has_visa, mode="costo")
+        return cost, path
+
+    def find_shortest_path_stops(self, origin: str, destination: str, has_visa: bool):
+        _, stops, path = self.find_route(origin, destination, has_visa, mode="escalas")
+        return stops, path
+
+    def get_layout(self, has_visa: bool):
+        """
+        Retorna las posiciones de los nodos del grafo filtrado para dibujarlo.
+        Se calculan una vez por grafo filtrado y solo se recalculan si cambian
+        sus aeropuertos o vuelos (no con un cambio de precio).
+        """
+        if has_visa not in self._layouts:
+            import networkx as nx
+
+            with self.profiler.operation("get_layout", has_visa=has_visa):
+                graph_to_draw = self.get_filtered_graph(has_visa)
+                with self.profiler.stage("layout"):
+                    self._layouts[has_visa] = nx.spring_layout(graph_to_draw, seed=42, k=0.9, iterations=50)
+        return self._layouts[has_visa]
+
+    def draw_graph_with_path(self, origin_node, destination_node, path_nodes=None, has_visa=True) -> "Figure":
         """
         Dibuja el grafo, resaltando una ruta si se proporciona.
         Retorna el objeto Figure de Matplotlib para ser incrustado en Tkinter.
+        Para redibujar varias consultas sobre la misma figura conviene usar
+        route_map.RouteMap directamente.
         """
-        graph_to_draw = self.get_filtered_graph(has_visa)
-        
-        pos = nx.spring_layout(graph_to_draw, seed=42, k=0.9, iterations=50) 
-        
-        
-        fig, ax = plt.subplots(figsize=(6, 4))
-        ax.clear()
-
-        all_nodes = list(self.graph.nodes()) 
-        visa_required_nodes = [node for node, data in self.graph.nodes(data=True) if data.get('requiere_visa', False)]
-        
-        current_nodes = list(graph_to_draw.nodes())
-        
-        
-        node_colors = []
-        for node in current_nodes:
-            if node == origin_node:
-                node_colors.append('lightgreen') # Origen
-            elif node == destination_node:
-                node_colors.append('salmon') # Destino
-            elif self.destinations[node]['requiere_visa']:
-                node_colors.append('lightblue') # Nodos con visa (accesibles si tiene visa)
-            else:
-                node_colors.append('lightgray') # Otros nodos
-
-        # Dibujar todos los nodos accesibles
-        nx.draw_networkx_nodes(graph_to_draw, pos, nodelist=current_nodes, 
-                               node_color=node_colors, node_size=1000, ax=ax, edgecolors='black')
-        
-        # Dibujar aristas generales
-        nx.draw_networkx_edges(graph_to_draw, pos, edgelist=graph_to_draw.edges(), 
-                               width=1.0, alpha=0.5, edge_color='gray', ax=ax)
-
-        # Resaltar la ruta si se proporciona
-        if path_nodes:
-            path_edges = [(path_nodes[i], path_nodes[i+1]) for i in range(len(path_nodes)-1)]
-
-            path_edges_undirected = []
-            for u, v in path_edges:
-                if graph_to_draw.has_edge(u,v):
-                    path_edges_undirected.append((u,v))
-                elif graph_to_draw.has_edge(v,u): 
-                    path_edges_undirected.append((v,u))
-
-            nx.draw_networkx_edges(graph_to_draw, pos, edgelist=path_edges_undirected, 
-                                   width=3.0, edge_color='red', ax=ax)
-            
-            # Resaltar los nodos de la ruta
-            nx.draw_networkx_nodes(graph_to_draw, pos, nodelist=path_nodes, node_color='gold', node_size=1200, ax=ax, edgecolors='black')
-            # Asegura de que el origen y destino siguen resaltados
-            if origin_node in path_nodes:
-                nx.draw_networkx_nodes(graph_to_draw, pos, nodelist=[origin_node], node_color='lightgreen', node_size=1200, ax=ax, edgecolors='black')
-            if destination_node in path_nodes:
-                nx.draw_networkx_nodes(graph_to_draw, pos, nodelist=[destination_node], node_color='salmon', node_size=1200, ax=ax, edgecolors='black')
-
-        # Etiquetas de nodos
-        nx.draw_networkx_labels(graph_to_draw, pos, font_size=9, font_weight='bold', ax=ax)
-
-        # Mostrar pesos de las aristas (costo o paradas)
-        edge_labels = nx.get_edge_attributes(graph_to_draw, 'cost') 
-        nx.draw_networkx_edge_labels(graph_to_draw, pos, edge_labels=edge_labels, font_size=8, ax=ax)
-
-        ax.set_title("Grafo de Rutas de Metro Travel")
-        ax.set_axis_on() 
-        plt.tight_layout() 
-        
-        return fig 
-
-    def find_k_shortest_paths_cost(self, origin: str, destination: str, has_visa: bool, k: int = 4):
+        from route_map import RouteMap
+
+        with self.profiler.operation("draw_graph_with_path", has_visa=has_visa):
+            self.get_layout(has_visa)
+            with self.profiler.stage("dibujo"):
+                route_map = RouteMap(self)
+                route_map.show_network(has_visa)
+                route_map.highlight(origin_node, destination_node, path_nodes)
+            return route_map.figure
+
+    def enable_profiling(self, log=None, trace_memory=False, history=1000):
+        """
+        Activa la instrumentación de las consultas y retorna el QueryProfiler.
+        log es una ruta o un archivo abierto donde escribir cada registro como
+        una línea JSON; trace_memory mide además el pico de memoria.
+        """
+        self.disable_profiling()
+        self.profiler = QueryProfiler(log=log, trace_memory=trace_memory, history=history)
+        return self.profiler
+
+    def disable_profiling(self):
+        """Desactiva la instrumentación y cierra su log."""
+        if self.profiler.enabled:
+            self.profiler.close()
+        self.profiler = NULL_PROFILER
+
+    def profile_stats(self):
+        """
+        Resumen por operación de los registros del profiler (tiempos por
+        etapa, nodos y aristas explorados, aciertos de caché, pico de
+        memoria). Retorna un diccionario vacío si la instrumentación está
+        desactivada.
+        """
+        if not self.profiler.enabled:
+            return {}
+        return self.profiler.stats()
+
+    def find_k_shortest_paths_cost(self, origin: str, destination: str, has_visa: bool, k: int = 4,
+                                   max_cost=None, max_stops=None):
         """
         Devuelve las k rutas más baratas (por costo) entre origen y destino.
+        Opcionalmente descarta rutas con costo mayor a max_cost o con más de
+        max_stops vuelos. Las rutas se generan de forma perezosa y la búsqueda
+        se detiene al obtener k de ellas.
         Retorna una lista de tuplas (costo_total, ruta).
         """
-        import heapq
-        current_graph = self.get_filtered_graph(has_visa)
-        if origin not in current_graph or destination not in current_graph:
+        key = (origin, destination, has_visa, "costo", k, max_cost, max_stops)
+        with self.profiler.operation("find_k_shortest_paths_cost", origin=origin, destination=destination,
+                                     has_visa=has_visa, k=k):
+            results = self._cached_routes(key, self._compute_k_routes,
+                                          origin, destination, has_visa, k, max_cost, max_stops)
+            return _copy_routes(results)
+
+    def _compute_k_routes(self, origin: str, destination: str, has_visa: bool, k: int, max_cost, max_stops):
+        space = self._search_space(has_visa)
+        if not space.contains(origin) or not space.contains(destination):
             return [(None, "Origen o destino no accesible sin visa o no existe.")]
         try:
-            paths = list(nx.shortest_simple_paths(current_graph, origin, destination, weight='cost'))
-            results = []
-            for path in paths[:k]:
-                cost = 0
-                for i in range(len(path)-1):
-                    cost += current_graph[path[i]][path[i+1]]['cost']
-                results.append((cost, path))
+            paths = _iter_cheapest_paths(space.neighbors, space.to_node(origin), space.to_node(destination),
+                                         max_cost=max_cost, max_stops=max_stops)
+            with self.profiler.stage("busqueda"):
+                results = [(cost, [space.to_code(node) for node in path]) for cost, path in islice(paths, k)]
+            if not results:
+                return [(None, "No se encontró una ruta por costo entre los destinos seleccionados.")]
             return results
-        except nx.NetworkXNoPath:
-            return [(None, "No se encontró una ruta por costo entre los destinos seleccionados.")]
         except Exception as e:
-            return [(None, f"Error al calcular las rutas por costo: {e}")] 
\ No newline at end of file
+            return [(None, f"Error al calcular las rutas por costo: {e}")]
+
+    def cache_stats(self):
+        """Retorna los contadores de la caché de rutas (aciertos, fallos, ocupación)."""
+        return self.route_cache.stats()